@@ -1,20 +1,19 @@
-
 import streamlit as st
-import os
-from translate_book import translate_file, create_interactive_html_block
-from io import BytesIO
+from translate_book import (
+    create_interactive_html_block, process_interactive_text, iter_translate_file, render_document,
+    interactive_pages, paginate, pending_text, find_job, PAGE_SIZE, SPEAK_BUTTON
+)
 from password_manager import PasswordManager
-import pandas as pd
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from usage_store import get_usage_store
+from metrics import get_metrics
+from job_store import get_job_store, is_leased
+from job_queue import get_job_queue, ACTIVE_STATUSES
+from datetime import datetime
 import streamlit.components.v1 as components
-import jieba
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import math
 from translator import Translator
-import plotly.graph_objects as go
+import segmenter
+
+# pandas/plotly chỉ dùng cho trang admin: import trong show_admin_interface
 
 
 # Initialize password manager only when needed
@@ -163,6 +162,15 @@ def show_user_interface(user_password=None):
     # Initialize translator
     translator = init_translator()
 
+    job_queue = get_job_queue()
+    run_in_background = False
+    if translation_mode == "Standard Translation" and job_queue is not None:
+        run_in_background = st.checkbox(
+            "Run in background",
+            value=False,
+            help="Keep translating even if you leave or reload this page. Results appear under Background Jobs."
+        )
+
     # Translation Button
     if st.button("Translate", key="translate_button"):
         if not second_language:
@@ -175,148 +183,47 @@ def show_user_interface(user_password=None):
 
         try:
             # Check usage limit before translation using Azure counting rules
-            chars_count = count_characters(text_input, include_english, second_language)
+            charged_text = text_input
+            if translation_mode == "Standard Translation":
+                # Cùng văn bản/cài đặt đang chạy ở phiên khác hoặc nền: không chạy (và tính phí) lần hai
+                if is_leased(find_job(
+                    text_input, include_english, languages[second_language], pinyin_style, get_job_store()
+                )):
+                    st.info("This text is already being translated. You can follow it under Background Jobs.")
+                    return
+                # Câu đã có trong checkpoint (lần chạy trước) không gửi lại API nên không tính phí
+                charged_text = pending_text(
+                    text_input, include_english, languages[second_language], pinyin_style, get_job_store()
+                )
+            chars_count = count_characters(charged_text, include_english, second_language)
             if not pm.check_usage_limit(st.session_state.current_user, chars_count):
                 daily_limit = pm.get_user_limit(st.session_state.current_user)
                 st.error(f"You have exceeded your daily translation limit ({daily_limit:,} characters). Please try again tomorrow.")
                 return
             
-            # Track usage if translation succeeds
-            pm.track_usage(st.session_state.current_user, chars_count)
-            
-            # Show current usage with premium status
-            daily_usage = pm.get_daily_usage(st.session_state.current_user)
-            daily_limit = pm.get_user_limit(st.session_state.current_user)
-            
-            # Get user's tier
-            key_name = pm.get_key_name(st.session_state.current_user)
-            user_tier = pm.user_tiers.get(key_name, "default")
-            
-            if user_tier == "premium" or pm.is_admin(st.session_state.current_user):
-                st.markdown(
-                    f"""
-                    <div style="padding: 10px;">
-                        Today's usage: {daily_usage:,}/{daily_limit:,} characters 
-                        <span style="
-                            background: linear-gradient(45deg, #FFD700, #FFA500);
-                            -webkit-background-clip: text;
-                            -webkit-text-fill-color: transparent;
-                            font-weight: bold;
-                            padding: 0 10px;
-                            text-shadow: 0px 0px 10px rgba(255,215,0,0.3);
-                            border: 1px solid #FFD700;
-                            border-radius: 15px;
-                            margin-left: 10px;
-                        ">
-                            Premium Account
-                        </span>
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
-            else:
-                st.info(f"Today's usage: {daily_usage:,}/{daily_limit:,} characters")
-            
             if translation_mode == "Interactive Word-by-Word":
+                charge_usage(pm, chars_count)
                 try:
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    # Step 1: Word segmentation with paragraph preservation
+                    # Step 1-2: Segment once, then resolve each distinct word in bulk
                     status_text.text("Step 1/3: Segmenting text...")
                     progress_bar.progress(10)
-                    
-                    # Split text into paragraphs first
-                    paragraphs = text_input.split('\n')
-                    all_words = []
-                    paragraph_breaks = []  # Track where paragraphs end
-                    
-                    for paragraph in paragraphs:
-                        if paragraph.strip():  # If paragraph is not empty
-                            # Use jieba.tokenize to get position information
-                            tokens = list(jieba.tokenize(paragraph))
-                            # Sort tokens by their start position to maintain order
-                            tokens.sort(key=lambda x: x[1])
-                            # Extract just the words while maintaining order
-                            words = [token[0] for token in tokens]
-                            all_words.extend(words)
-                            paragraph_breaks.append(len(all_words))
-                        else:
-                            # Add a special marker for empty paragraphs
-                            all_words.append('\n')
-                            paragraph_breaks.append(len(all_words))
-                    
-                    total_words = len(all_words)
-                    
-                    # Step 2: Processing words in parallel while maintaining order
-                    status_text.text("Step 2/3: Processing words in parallel...")
-                    processed_words = [None] * total_words  # Pre-allocate list with correct size
-                    
-                    # Function to process a batch of words
-                    def process_word_batch(word_batch, start_index, translator):
-                        results = []
-                        for i, word in enumerate(word_batch):
-                            try:
-                                if word == '\n':
-                                    results.append((start_index + i, {'word': '\n'}))
-                                elif word.strip():
-                                    result = translator.process_chinese_text(
-                                        word, 
-                                        languages[second_language]
-                                    )
-                                    # Create a properly structured dictionary even if translation fails
-                                    word_dict = {
-                                        'word': word,
-                                        'pinyin': '',
-                                        'translations': []
-                                    }
-                                    if result and len(result) > 0:
-                                        word_dict.update(result[0])  # Only update if we have valid results
-                                    results.append((start_index + i, word_dict))
-                                else:
-                                    # Handle empty strings
-                                    results.append((start_index + i, {'word': '', 'pinyin': '', 'translations': []}))
-                            except Exception as e:
-                                print(f"Error processing word '{word}': {str(e)}")
-                                # Always return a valid dictionary structure
-                                results.append((start_index + i, {'word': word, 'pinyin': '', 'translations': []}))
-                        return results
-                    
-                    # Create batches while preserving order
-                    batch_size = 5
-                    batches = []
-                    for i in range(0, len(all_words), batch_size):
-                        batch = all_words[i:i + batch_size]
-                        batches.append((i, batch))
-                    
-                    # Process batches in parallel
-                    with ThreadPoolExecutor(max_workers=3) as executor:
-                        futures = []
-                        for start_idx, batch in batches:
-                            future = executor.submit(
-                                process_word_batch, 
-                                batch,
-                                start_idx,
-                                translator
-                            )
-                            futures.append(future)
-                        
-                        completed = 0
-                        for future in as_completed(futures):
-                            try:
-                                # Get results and place them in the correct positions
-                                for idx, result in future.result():
-                                    processed_words[idx] = result
-                                
-                                completed += 1
-                                progress = 10 + (completed / len(batches) * 60)
-                                progress_bar.progress(int(progress))
-                                status_text.text(
-                                    f"Step 2/3: Processing words... "
-                                    f"(Batch {completed}/{len(batches)})"
-                                )
-                            except Exception as e:
-                                st.error(f"Error processing batch: {str(e)}")
+                    if not segmenter.is_ready():
+                        with st.spinner("Loading word segmenter..."):
+                            segmenter.warm_up()
+
+                    def update_word_progress(p):
+                        progress_bar.progress(int(10 + p * 0.6))
+                        status_text.text(f"Step 2/3: Processing words... ({p:.0f}%)")
+
+                    processed_words = process_interactive_text(
+                        text_input,
+                        languages[second_language],
+                        update_word_progress,
+                        pinyin_style
+                    )
                     
                     # Step 3: Generating HTML
                     status_text.text("Step 3/3: Generating interactive HTML...")
@@ -326,59 +233,221 @@ def process_word_batch(word_batch, start_index, translator):
                     if any(word is None for word in processed_words):
                         raise ValueError("Some words failed to process")
                     
-                    html_content = translate_file(
-                        text_input,
-                        None,
-                        include_english,
-                        languages[second_language],
-                        pinyin_style,
-                        translation_mode,
-                        processed_words=[word for word in processed_words if word is not None]  # Filter None values
+                    pages = interactive_pages(
+                        [word for word in processed_words if word is not None],  # Filter None values
+                        include_english
+                    )
+                    store_result(
+                        [block for block, _ in pages],
+                        [(n, n + 1, title) for n, (_, title) in enumerate(pages)]
                     )
                     
                     # Complete
                     progress_bar.progress(100)
                     status_text.text("Translation completed!")
-                    
-                    # Move download button right after success message
                     st.success("Translation completed!")
-                    st.download_button(
-                        label="Download HTML",
-                        data=html_content.encode('utf-8'),
-                        file_name="translation.html",
-                        mime="text/html; charset=utf-8"
-                    )
-                    # Display translation result
-                    components.html(html_content, height=800, scrolling=True)
                     
                 except Exception as e:
                     st.error(f"Translation error: {str(e)}")
+            elif run_in_background:
+                _, queued = job_queue.submit(
+                    text_input,
+                    owner=pm.get_key_name(st.session_state.current_user),
+                    include_english=include_english,
+                    second_language=languages[second_language],
+                    pinyin_style=pinyin_style
+                )
+                # Chỉ trừ quota khi job thực sự được xếp hàng, không phải khi nó đã đang chạy
+                if queued:
+                    charge_usage(pm, chars_count)
+                    st.success("Translation started in the background. You can follow it under Background Jobs.")
+                else:
+                    st.info("This text is already being translated. You can follow it under Background Jobs.")
             else:
                 # Standard translation mode
+                charge_usage(pm, chars_count)
                 progress_bar = st.progress(0)
                 status_text = st.empty()
                 
-                html_content = translate_file(
+                # Hiển thị từng câu ngay khi dịch xong
+                # Chỉ giữ tối đa một trang trên màn hình, trang kết quả đầy đủ nằm ở viewer bên dưới
+                live_placeholder = st.empty()
+                live_view = live_placeholder.container()
+                blocks = []
+                run_report = {}
+                for block in iter_translate_file(
                     text_input,
                     lambda p: update_progress(p, progress_bar, status_text),
                     include_english,
                     languages[second_language],
                     pinyin_style,
-                    translation_mode
-                )
-                # Move download button right after success message
+                    report=run_report,
+                    job_store=get_job_store()
+                ):
+                    if blocks and len(blocks) % PAGE_SIZE == 0:
+                        live_view = live_placeholder.container()
+                    blocks.append(block)
+                    # Bản xem trước không có CSS/JS của template nên bỏ nút đọc
+                    live_view.markdown(block.replace(SPEAK_BUTTON, ''), unsafe_allow_html=True)
+                live_placeholder.empty()
+
+                store_result(blocks, paginate(len(blocks), run_report.get('chapters', [])))
                 st.success("Translation completed!")
+                if run_report.get('resumed_chunks'):
+                    st.caption(f"Resumed from checkpoint: {run_report['resumed_chunks']:,} sentences were already translated")
+                if run_report.get('failed_chunks'):
+                    st.warning(
+                        f"{run_report['failed_chunks']:,} sentences failed. "
+                        "Press Translate again to retry only those sentences."
+                    )
+                if run_report.get('chunks'):
+                    st.caption(
+                        f"{run_report['chunks']:,} sentences, {run_report['unique_chunks']:,} unique, "
+                        f"packed into {len(run_report['request_units']):,} request units "
+                        f"({run_report['api_calls_saved']:,} API calls saved by reusing repeated sentences)"
+                    )
+                if run_report.get('timings'):
+                    st.caption("Stage timings: " + ", ".join(
+                        f"{stage} {seconds:.2f}s" for stage, seconds in run_report['timings'].items()
+                    ))
+            
+        except Exception as e:
+            st.error(f"Translation error: {str(e)}")
+
+    show_result_viewer()
+
+    if job_queue is not None:
+        show_background_jobs(job_queue, pm.get_key_name(st.session_state.current_user))
+
+
+def charge_usage(pm, chars_count):
+    """Add chars_count to the user's daily usage and show the new total"""
+    user = st.session_state.current_user
+    pm.track_usage(user, chars_count)
+
+    # Show current usage with premium status
+    daily_usage = pm.get_daily_usage(user)
+    daily_limit = pm.get_user_limit(user)
+
+    # Get user's tier
+    user_tier = pm.get_user_tier(user)
+
+    if user_tier == "premium" or pm.is_admin(user):
+        st.markdown(
+            f"""
+            <div style="padding: 10px;">
+                Today's usage: {daily_usage:,}/{daily_limit:,} characters 
+                <span style="
+                    background: linear-gradient(45deg, #FFD700, #FFA500);
+                    -webkit-background-clip: text;
+                    -webkit-text-fill-color: transparent;
+                    font-weight: bold;
+                    padding: 0 10px;
+                    text-shadow: 0px 0px 10px rgba(255,215,0,0.3);
+                    border: 1px solid #FFD700;
+                    border-radius: 15px;
+                    margin-left: 10px;
+                ">
+                    Premium Account
+                </span>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+    else:
+        st.info(f"Today's usage: {daily_usage:,}/{daily_limit:,} characters")
+
+
+def store_result(blocks, pages):
+    """Keep a finished translation in the session so the viewer survives reruns"""
+    st.session_state.translation_result = {'blocks': blocks, 'pages': pages, 'rendered': {}}
+    st.session_state.result_page = 0
+
+
+def set_result_page(page):
+    st.session_state.result_page = page
+
+
+def page_html(result, page):
+    """HTML of one viewer page; its neighbours are rendered too so Previous/Next is instant"""
+    rendered = result['rendered']
+    for n in (page, page - 1, page + 1):
+        if 0 <= n < len(result['pages']) and n not in rendered:
+            start, stop, _ = result['pages'][n]
+            rendered[n] = render_document(result['blocks'][start:stop])
+    # Chỉ giữ trang đang xem và hai trang bên cạnh
+    for n in [n for n in rendered if abs(n - page) > 1]:
+        del rendered[n]
+    return rendered[page]
+
+
+def show_result_viewer():
+    """Paginated view of the last translation; the full document is only built for the download"""
+    result = st.session_state.get('translation_result')
+    if not result or not result['pages']:
+        return
+    pages = result['pages']
+
+    st.download_button(
+        label="Download HTML",
+        data=lambda: render_document(result['blocks']),
+        file_name="translation.html",
+        mime="text/html",
+        key="download_result"
+    )
+
+    page = min(st.session_state.get('result_page', 0), len(pages) - 1)
+    if len(pages) > 1:
+        col1, col2, col3 = st.columns([1, 4, 1])
+        with col1:
+            st.button("◀ Previous", key="result_previous", disabled=page == 0,
+                      on_click=set_result_page, args=(page - 1,))
+        with col2:
+            page = st.selectbox(
+                "Page",
+                range(len(pages)),
+                format_func=lambda n: f"Page {n + 1}/{len(pages)}" + (f" · {pages[n][2]}" if pages[n][2] else ""),
+                key="result_page",
+                label_visibility="collapsed"
+            )
+        with col3:
+            st.button("Next ▶", key="result_next", disabled=page == len(pages) - 1,
+                      on_click=set_result_page, args=(page + 1,))
+
+    # Display translation result
+    components.html(page_html(result, page), height=800, scrolling=True)
+
+
+def show_background_jobs(job_queue, owner):
+    """List the user's background jobs, polling while any of them is still running"""
+    jobs = job_queue.list_jobs(owner)
+    if not jobs:
+        return
+    active = any(job['status'] in ACTIVE_STATUSES for job in jobs)
+    st.fragment(render_job_list, run_every=3 if active else None)(job_queue, owner)
+
+
+def render_job_list(job_queue, owner):
+    st.header("Background Jobs")
+    for job in job_queue.list_jobs(owner):
+        created = datetime.fromtimestamp(job['created']).strftime('%Y-%m-%d %H:%M')
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.progress(
+                job['progress'] / 100,
+                text=f"{created} · {job['status']} · {job['done'] + job['failed']:,}/{job['total']:,} sentences"
+            )
+            if job['failed']:
+                st.caption(f"{job['failed']:,} sentences failed; submit the same text again to retry them.")
+        with col2:
+            if job['done']:
                 st.download_button(
                     label="Download HTML",
-                    data=html_content,
+                    data=lambda job_id=job['job_id']: job_queue.render(job_id),
                     file_name="translation.html",
-                    mime="text/html"
+                    mime="text/html",
+                    key=f"download_{job['job_id']}"
                 )
-                # Display translation result
-                components.html(html_content, height=800, scrolling=True)
-            
-        except Exception as e:
-            st.error(f"Translation error: {str(e)}")
 
 
 def update_progress(progress, progress_bar, status_text):
@@ -427,9 +496,6 @@ def create_word_tooltip_html(processed_words, target_lang):
     if not processed_words or not isinstance(processed_words, (list, tuple)):
         raise ValueError("processed_words must be a non-empty list or tuple")
         
-    with open('template.html', 'r', encoding='utf-8') as template_file:
-        template_content = template_file.read()
-    
     is_dark_theme = 'dark' in st.config.get_option('theme.base')
     
     content_html = f"""
@@ -484,16 +550,12 @@ def create_word_tooltip_html(processed_words, target_lang):
     
     content_html += "</div>"
     
-    final_html = template_content.replace('{{content}}', content_html)
-    return final_html
+    return render_document([content_html])
 
 
 def create_interactive_html(processed_words, include_english):
     """Create HTML content for interactive translation"""
     try:
-        with open('template.html', 'r', encoding='utf-8') as template_file:
-            html_content = template_file.read()
-        
         # Add error checking for processed_words
         if processed_words is None:
             raise ValueError("processed_words cannot be None")
@@ -507,13 +569,72 @@ def create_interactive_html(processed_words, include_english):
         if translation_content is None:
             raise ValueError("Failed to generate translation content")
             
-        return html_content.replace('{{content}}', translation_content)
+        return render_document([translation_content])
         
     except Exception as e:
         st.error(f"Error creating interactive HTML: {str(e)}")
         return None
 
 
+@st.cache_data(max_entries=8, show_spinner=False)
+def build_overview_figures(data_version):
+    """Overview charts from the usage rollups; rebuilt only when data_version changes"""
+    import pandas as pd
+    import plotly.graph_objects as go
+
+    store = get_usage_store()
+    tier_df = pd.DataFrame(store.tier_daily(), columns=['Tier', 'Date', 'Characters'])
+    # Một pivot cho cả trang tổng quan: ngày x tier
+    pivot = tier_df.pivot_table(index='Date', columns='Tier', values='Characters', aggfunc='sum', fill_value=0)
+
+    daily_fig = go.Figure(data=[
+        go.Bar(x=pivot.index, y=pivot[tier], name=tier) for tier in pivot.columns
+    ])
+    daily_fig.update_layout(
+        title='Daily Translation Usage',
+        xaxis_title='Date',
+        yaxis_title='Characters Translated',
+        barmode='stack'
+    )
+
+    weekly = store.weekly_totals()
+    weekly_fig = go.Figure(data=[
+        go.Bar(x=list(weekly.keys()), y=list(weekly.values()), name='Weekly Usage')
+    ])
+    weekly_fig.update_layout(
+        title='Weekly Translation Usage',
+        xaxis_title='Week',
+        yaxis_title='Characters Translated'
+    )
+
+    return {
+        'daily': daily_fig if not pivot.empty else None,
+        'weekly': weekly_fig if weekly else None,
+        'tiers': {tier: int(total) for tier, total in pivot.sum().items()},
+    }
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def build_user_figure(user, data_version):
+    import plotly.graph_objects as go
+
+    days = get_usage_store().user_daily(user)
+    fig = go.Figure(data=[
+        go.Scatter(
+            x=list(days.keys()),
+            y=list(days.values()),
+            mode='lines+markers',
+            name='Usage'
+        )
+    ])
+    fig.update_layout(
+        title=f'Usage Over Time - {user}',
+        xaxis_title='Date',
+        yaxis_title='Characters'
+    )
+    return fig
+
+
 def show_admin_interface():
     """Show admin interface with usage statistics"""
     st.title("Admin Dashboard")
@@ -525,66 +646,121 @@ def show_admin_interface():
         
     # Get usage statistics
     try:
-        stats = pm.get_usage_stats()
+        store = pm.usage_store
+        data_version = store.data_version()
+        summary = store.summary()
+        overview = build_overview_figures(data_version)
         
         # Display overall statistics
         st.header("Overall Statistics")
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("Total Users", stats['total_users'])
+            st.metric("Total Users", summary['users'])
         with col2:
-            total_chars = sum(stats['daily_stats'].values())
-            st.metric("Total Characters Translated", f"{total_chars:,}")
+            st.metric("Total Characters Translated", f"{summary['chars']:,}")
+        if overview['tiers']:
+            for col, (tier, total) in zip(st.columns(len(overview['tiers'])), overview['tiers'].items()):
+                col.metric(f"Tier: {tier}", f"{total:,}")
         
         # Daily usage graph
         st.header("Daily Usage")
-        daily_df = pd.DataFrame(
-            list(stats['daily_stats'].items()),
-            columns=['Date', 'Characters']
-        )
-        if not daily_df.empty:
-            fig = go.Figure(data=[
-                go.Bar(
-                    x=daily_df['Date'],
-                    y=daily_df['Characters'],
-                    name='Daily Usage'
-                )
-            ])
-            fig.update_layout(
-                title='Daily Translation Usage',
-                xaxis_title='Date',
-                yaxis_title='Characters Translated'
-            )
-            st.plotly_chart(fig)
+        if overview['daily'] is not None:
+            st.plotly_chart(overview['daily'])
+        if overview['weekly'] is not None:
+            st.plotly_chart(overview['weekly'])
         
-        # User statistics
+        # User statistics: chỉ đọc một trang từ rollup theo user
         st.header("User Statistics")
-        for user, dates in stats['user_stats'].items():
-            with st.expander(f"User: {user}"):
-                user_df = pd.DataFrame(
-                    list(dates.items()),
-                    columns=['Date', 'Characters']
-                )
-                st.dataframe(user_df)
-                
-                # User usage graph
-                fig = go.Figure(data=[
-                    go.Scatter(
-                        x=user_df['Date'],
-                        y=user_df['Characters'],
-                        mode='lines+markers',
-                        name='Usage'
-                    )
-                ])
-                fig.update_layout(
-                    title=f'Usage Over Time - {user}',
-                    xaxis_title='Date',
-                    yaxis_title='Characters'
-                )
-                st.plotly_chart(fig)
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            search = st.text_input("Search users", key="admin_user_search")
+        with col2:
+            page_size = st.selectbox("Rows per page", [20, 50, 100], key="admin_page_size")
+        matching = store.count_users(search)
+        pages = max(1, -(-matching // page_size))
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key="admin_user_page")
+        rows = store.user_page(search, (page - 1) * page_size, page_size)
+        
+        if not rows:
+            st.info("No users found")
+        else:
+            st.dataframe(
+                [
+                    {'User': row['user'], 'Tier': row['tier'], 'Characters': row['total'], 'Last Active': row['last_day']}
+                    for row in rows
+                ]
+            )
+            
+            user = st.selectbox("Show usage for", [row['user'] for row in rows], key="admin_user_detail")
+            st.plotly_chart(build_user_figure(user, data_version))
     except Exception as e:
         st.error(f"Error loading statistics: {str(e)}")
 
+    show_performance_metrics()
+
+
+def show_performance_metrics():
+    """Translation request metrics of this server process"""
+    st.header("Performance")
+    snapshot = get_metrics().snapshot()
+    counters = snapshot['counters']
+    latency = snapshot['histograms'].get('request_seconds')
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("API Requests", f"{counters.get('requests', 0):,}")
+    col2.metric("Latency p50 / p99", f"{latency['p50']:.2f}s / {latency['p99']:.2f}s" if latency else "-")
+    col3.metric("Cache Hit Ratio", f"{snapshot['cache_hit_ratio']:.0%}")
+    col4.metric("In Flight", int(snapshot['gauges'].get('in_flight', 0)))
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("429 Responses", f"{counters.get('rate_limited', 0):,}")
+    col2.metric("Retries", f"{counters.get('retries', 0):,}")
+    col3.metric("Errors", f"{counters.get('errors', 0):,}")
+    col4.metric("Current Rate", f"{Translator().rate_limiter.rate:.2f} req/s")
+
+    st.caption(
+        f"Characters in/out: {counters.get('chars_in', 0):,} / {counters.get('chars_out', 0):,} · "
+        f"Tokens in/out: {counters.get('tokens_in', 0):,} / {counters.get('tokens_out', 0):,}"
+    )
+    hedger = Translator().hedger
+    if hedger is not None:
+        delay = hedger.snapshot()['delay']
+        st.caption(
+            f"Hedged requests: {counters.get('hedges', 0):,} sent, {counters.get('hedge_wins', 0):,} won, "
+            f"{counters.get('hedges_over_budget', 0):,} skipped (budget) · "
+            f"hedge delay: {'warming up' if delay is None else f'{delay:.2f}s'}"
+        )
+
+    stages = [
+        {
+            'Stage': name[len('stage_'):-len('_seconds')],
+            'Jobs': histogram['count'],
+            'Mean (s)': round(histogram['mean'], 3),
+            'p50 (s)': round(histogram['p50'], 3),
+            'p99 (s)': round(histogram['p99'], 3),
+        }
+        for name, histogram in sorted(snapshot['histograms'].items())
+        if name.startswith('stage_')
+    ]
+    if stages:
+        st.dataframe(stages)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            "Download metrics (JSON)",
+            data=lambda: get_metrics().to_json(),
+            file_name="metrics.json",
+            mime="application/json"
+        )
+    with col2:
+        st.download_button(
+            "Download metrics (Prometheus)",
+            data=lambda: get_metrics().to_prometheus(),
+            file_name="metrics.prom",
+            mime="text/plain"
+        )
+
 
 def count_characters(text, include_english=True, second_language=None):
     """Count characters according to Azure Translator rules"""
@@ -607,6 +783,9 @@ def main():
         initial_sidebar_state="collapsed"
     )
 
+    # Nạp sẵn từ điển jieba nếu server không được khởi động qua serve.py
+    segmenter.warm_up_async()
+
     # Get URL parameters using st.query_params
     url_key = st.query_params.get('key', None)
 
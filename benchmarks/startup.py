@@ -0,0 +1,105 @@
+"""Cold-start benchmark: import-time profile of app.py plus process and first-render timings.
+
+Every measurement runs in a fresh interpreter so nothing is already in sys.modules.
+
+Usage: python benchmarks/startup.py [--runs 5] [--top 20] [--json results.jsonl]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_APP = "import sys; sys.path.insert(0, %r); import app" % ROOT
+
+FIRST_RENDER = """
+import sys, time
+sys.path.insert(0, %r)
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(%r, default_timeout=120)
+at.run()
+if at.exception:
+    raise SystemExit(str(at.exception))
+print(time.perf_counter() - start)
+""" % (ROOT, os.path.join(ROOT, "app.py"))
+
+
+def _python(code: str, *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+
+def import_profile(top: int) -> list:
+    """(module, self_ms, cumulative_ms) for the slowest imports, from python -X importtime"""
+    stderr = _python(IMPORT_APP, "-X", "importtime").stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    # Chỉ giữ module gốc của mỗi package để bảng không lặp lại cùng một chi phí
+    top_level = {}
+    for name, self_ms, cumulative_ms in rows:
+        root = name.split(".")[0]
+        if cumulative_ms > top_level.get(root, (name, 0, 0))[2]:
+            top_level[root] = (name, self_ms, cumulative_ms)
+    return sorted(top_level.values(), key=lambda row: row[2], reverse=True)[:top]
+
+
+def time_process(code: str, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        _python(code)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def time_first_render(runs: int) -> list:
+    return [float(_python(FIRST_RENDER).stdout.strip().splitlines()[-1]) for _ in range(runs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", help="append the summary as one JSON line to this file")
+    args = parser.parse_args()
+
+    profile = import_profile(args.top)
+    print(f"{'module':<40} {'self ms':>10} {'cumul. ms':>10}")
+    for name, self_ms, cumulative_ms in profile:
+        print(f"{name:<40} {self_ms:>10.1f} {cumulative_ms:>10.1f}")
+
+    interpreter = time_process("pass", args.runs)
+    import_app = time_process(IMPORT_APP, args.runs)
+    first_render = time_first_render(args.runs)
+
+    summary = {
+        "timestamp": time.time(),
+        "python": sys.version.split()[0],
+        "interpreter_s": statistics.median(interpreter),
+        "import_app_s": statistics.median(import_app),
+        "first_render_s": statistics.median(first_render),
+        "top_imports_ms": {name: round(cumulative_ms, 1) for name, _, cumulative_ms in profile},
+    }
+    print()
+    print(f"interpreter startup : {summary['interpreter_s'] * 1000:8.1f} ms (median of {args.runs})")
+    print(f"import app          : {summary['import_app_s'] * 1000:8.1f} ms (process wall time)")
+    print(f"first render        : {summary['first_render_s'] * 1000:8.1f} ms (AppTest, in-process)")
+
+    if args.json:
+        with open(args.json, "a", encoding="utf-8") as f:
+            f.write(json.dumps(summary) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""Offline throughput benchmark: the translation pipelines against a local Gemini stand-in.
+
+Translator.model is replaced by StubModel, which answers both single and batched prompts after a
+configurable latency (plus jitter) and can inject 429 errors, so no quota is spent. Every
+scenario runs on synthetic corpora of the requested sizes (or on a real file) and reports
+throughput, API calls per 1k characters, p50/p99 request latency and peak traced memory.
+
+Usage: python benchmarks/throughput.py [--sizes 1k,100k,1m] [--corpus book.txt]
+                                       [--latency 0.3] [--jitter 0.2] [--error-rate 0.01]
+                                       [--slow-rate 0.02 --slow-factor 10] [--hedge --hedge-min-delay 0.5]
+                                       [--scenarios split,split_stream,pinyin,standard,interactive]
+                                       [--verify] [--json out.jsonl]
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import segmenter  # noqa: E402
+from hedging import Hedger  # noqa: E402
+from rate_limiter import AdaptiveRateLimiter  # noqa: E402
+from sentence_stream import iter_sentences  # noqa: E402
+from translate_book import (  # noqa: E402
+    convert_to_pinyin, process_interactive_text, split_sentence, translate_file
+)
+from translator import Translator  # noqa: E402
+
+VOCABULARY = (
+    "我们 你们 他们 今天 明天 昨天 时候 地方 朋友 老师 学生 学校 城市 国家 世界 问题 事情 东西 "
+    "时间 工作 生活 知道 觉得 喜欢 希望 开始 结束 发现 认为 需要 准备 离开 回来 出去 进来 看见 "
+    "听说 告诉 回答 相信 明白 忘记 记得 等待 帮助 休息 吃饭 喝茶 睡觉 走路 跑步 唱歌 跳舞 读书 "
+    "写字 说话 一起 已经 还是 但是 因为 所以 如果 虽然 然后 终于 突然 慢慢 非常 特别 真的 可能 "
+    "应该 一定 马上 现在 以后 以前 外面 里面 山上 河边 天空 月亮 太阳 星星 风雨 花园 房子 门口 "
+    "窗户 桌子 椅子 衣服 书包 眼睛 心里 声音 故事 消息 办法 意思 机会 感情 美丽 安静 热闹 高兴 "
+    "难过 奇怪 重要 简单 复杂 年轻 老人 孩子 母亲 父亲 兄弟 姐妹 先生 小姐 皇帝 将军 江湖 剑客"
+).split()
+SPEAKERS = ("他说", "她问道", "老人笑着说", "将军大声喊道", "孩子小声说")
+ENDINGS = "。。。。！？"
+
+SIZE_SUFFIXES = {'k': 1024, 'm': 1024 * 1024}
+
+
+class StubResponse:
+    def __init__(self, text: str, prompt: str):
+        self.text = text
+        # Ước lượng token như Gemini: khoảng 1 token cho mỗi chữ Hán
+        self.usage_metadata = type("Usage", (), {
+            'prompt_token_count': len(prompt),
+            'candidates_token_count': len(text) // 4,
+        })()
+
+
+class StubModel:
+    """Stands in for genai.GenerativeModel: echoes translations after a simulated latency"""
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.2, error_rate: float = 0.0, seed: int = 0,
+                 slow_rate: float = 0.0, slow_factor: float = 10.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        # Một phần nhỏ request chậm gấp nhiều lần (đuôi p99) để đo hiệu quả của hedging
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.calls = 0
+        self.rate_limited = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _next_call(self) -> tuple:
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter) * self.latency)
+            if self._random.random() < self.slow_rate:
+                delay *= self.slow_factor
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.rate_limited += 1
+        return delay, failed
+
+    @staticmethod
+    def _answer(prompt: str, generation_config) -> StubResponse:
+        if generation_config is not None and "Segments: " in prompt:
+            segments = json.loads(prompt.split("Segments: ", 1)[1])
+            translations = [{"id": s["id"], "translation": f"<{len(s['text'])} chars>"} for s in segments]
+            return StubResponse(json.dumps(translations), prompt)
+        text = prompt.rsplit("Text: ", 1)[-1]
+        return StubResponse(f"<{len(text)} chars>", prompt)
+
+    def generate_content(self, prompt, generation_config=None):
+        delay, failed = self._next_call()
+        time.sleep(delay)
+        if failed:
+            raise Exception("429 Resource has been exhausted (e.g. check quota).")
+        return self._answer(prompt, generation_config)
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        delay, failed = self._next_call()
+        await asyncio.sleep(delay)
+        if failed:
+            raise Exception("429 Resource has been exhausted (e.g. check quota).")
+        return self._answer(prompt, generation_config)
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    if value[-1] in SIZE_SUFFIXES:
+        return int(float(value[:-1]) * SIZE_SUFFIXES[value[-1]])
+    return int(value)
+
+
+def synthetic_corpus(size_bytes: int, seed: int = 0) -> str:
+    """Novel-like text of about size_bytes UTF-8 bytes: chapters, paragraphs, dialogue, repeats"""
+    rng = random.Random(seed)
+    parts, size, chapter = [], 0, 0
+    while size < size_bytes:
+        if chapter == 0 or rng.random() < 0.02:
+            chapter += 1
+            paragraph = f"第{chapter}章"
+        else:
+            sentences = []
+            for _ in range(rng.randint(2, 6)):
+                sentence = "".join(rng.choices(VOCABULARY, k=rng.randint(3, 12))) + rng.choice(ENDINGS)
+                if rng.random() < 0.2:
+                    sentence = f"{rng.choice(SPEAKERS)}：“{sentence}”"
+                sentences.append(sentence)
+            paragraph = "".join(sentences)
+        parts.append(paragraph)
+        size += len(paragraph.encode("utf-8")) + 1
+    return "\n".join(parts)
+
+
+def unpunctuated_corpus(size_bytes: int, seed: int = 0) -> str:
+    """Subtitle-like text of about size_bytes: short lines with no sentence punctuation at all"""
+    rng = random.Random(seed)
+    lines, size = [], 0
+    while size < size_bytes:
+        line = " ".join("".join(rng.choices(VOCABULARY, k=rng.randint(1, 4))) for _ in range(rng.randint(1, 3)))
+        lines.append(line)
+        size += len(line.encode("utf-8")) + 1
+    return "\n".join(lines)
+
+
+def percentile(samples: list, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Harness:
+    """Swaps the stub into the Translator singleton and times every Gemini call it makes"""
+
+    def __init__(self, model: StubModel, rate: float, cooldown: float, hedger: Hedger = None):
+        # Nạp từ điển jieba trước để không tính cold start vào kịch bản đầu tiên
+        segmenter.warm_up()
+        self.model = model
+        self.latencies = []
+        self.translator = Translator()
+        self.translator.model = model
+        self.translator.model_name = "stub"
+        self.translator.is_ready = True
+        self.translator.cache = None
+        self.translator.hedger = hedger
+        self.translator.rate_limiter = AdaptiveRateLimiter(
+            rate=rate, max_rate=rate, burst=max(4.0, rate), cooldown=cooldown
+        )
+
+        # Đo từ lúc gọi tới khi có kết quả: gồm cả thời gian chờ limiter và retry
+        generate, generate_async = self.translator._generate, self.translator._generate_async
+
+        def timed_generate(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return generate(*args, **kwargs)
+            finally:
+                self.latencies.append(time.perf_counter() - started)
+
+        async def timed_generate_async(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await generate_async(*args, **kwargs)
+            finally:
+                self.latencies.append(time.perf_counter() - started)
+
+        self.translator._generate = timed_generate
+        self.translator._generate_async = timed_generate_async
+
+    def reset(self):
+        self.translator.translated_words.clear()
+        self.latencies = []
+        self.model.calls = 0
+        self.model.rate_limited = 0
+
+
+def scenario_split(text: str, harness: Harness):
+    return len(split_sentence(text)), "sentences"
+
+
+def utf8_lines(text: str):
+    # Như đọc file đã upload từng dòng: iter_sentences nhận bytes và tự decode
+    return (line.encode('utf-8') for line in io.StringIO(text))
+
+
+def scenario_split_stream(text: str, harness: Harness):
+    return sum(1 for _ in iter_sentences(utf8_lines(text))), "sentences"
+
+
+def scenario_pinyin(text: str, harness: Harness):
+    chunks = split_sentence(text)
+    for chunk in chunks:
+        convert_to_pinyin(chunk)
+    return len(chunks), "sentences"
+
+
+def scenario_standard(text: str, harness: Harness):
+    report = {}
+    translate_file(text, include_english=True, second_language="vi", report=report)
+    return report.get('chunks', 0), "sentences"
+
+
+def scenario_interactive(text: str, harness: Harness):
+    return len(process_interactive_text(text, "vi")), "words"
+
+
+SCENARIOS = {
+    'split': scenario_split,
+    'split_stream': scenario_split_stream,
+    'pinyin': scenario_pinyin,
+    'standard': scenario_standard,
+    'interactive': scenario_interactive,
+}
+
+
+def run_scenario(name: str, text: str, harness: Harness, memory: bool) -> dict:
+    harness.reset()
+    started = time.perf_counter()
+    units, unit_name = SCENARIOS[name](text, harness)
+    elapsed = time.perf_counter() - started
+    calls, rate_limited, latencies = harness.model.calls, harness.model.rate_limited, harness.latencies
+
+    peak = None
+    if memory:
+        # Lần chạy riêng: tracemalloc làm chậm code Python nên không đo thời gian cùng lúc
+        harness.reset()
+        tracemalloc.start()
+        SCENARIOS[name](text, harness)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'scenario': name,
+        'chars': len(text),
+        'units': units,
+        'unit': unit_name,
+        'seconds': elapsed,
+        'units_per_second': units / elapsed if elapsed else 0.0,
+        'api_calls': calls,
+        'rate_limited': rate_limited,
+        'calls_per_1k_chars': calls / len(text) * 1000 if text else 0.0,
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p99': percentile(latencies, 0.99),
+        'peak_memory_mb': peak / 1024 / 1024 if peak is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1k,100k,1m", help="synthetic corpus sizes in bytes (k/m suffixes)")
+    parser.add_argument("--corpus", help="also run on this UTF-8 text file")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.3, help="mean stub latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency jitter as a fraction of --latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with a 429")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of calls that are stragglers")
+    parser.add_argument("--slow-factor", type=float, default=10.0, help="how much slower a straggler is")
+    parser.add_argument("--hedge", action="store_true", help="enable hedged requests")
+    parser.add_argument("--hedge-percentile", type=float, default=0.95)
+    parser.add_argument("--hedge-min-delay", type=float, default=0.5)
+    parser.add_argument("--hedge-budget", type=float, default=0.05)
+    parser.add_argument("--rate", type=float, default=50.0, help="request rate the limiter allows")
+    parser.add_argument("--cooldown", type=float, default=5.0, help="limiter cooldown after a 429")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--verify", action="store_true",
+                        help="check that iter_sentences matches split_sentence on every corpus (and a punctuation-free one) first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="append one JSON line per result to this file")
+    args = parser.parse_args()
+
+    corpora = [(size, synthetic_corpus(parse_size(size), args.seed)) for size in args.sizes.split(",") if size]
+    if args.corpus:
+        with open(args.corpus, 'r', encoding='utf-8') as f:
+            corpora.append((os.path.basename(args.corpus), f.read()))
+
+    if args.verify:
+        # Văn bản không dấu câu: cả văn bản là một câu chưa xong, dễ lộ việc quét lại buffer
+        unpunctuated = [
+            (f"{size}-nopunct", unpunctuated_corpus(parse_size(size), args.seed))
+            for size in args.sizes.split(",") if size
+        ]
+        for label, text in corpora + unpunctuated:
+            expected = split_sentence(text)
+            started = time.perf_counter()
+            streamed = [sentence for sentence, _, _ in iter_sentences(utf8_lines(text))]
+            elapsed = time.perf_counter() - started
+            if streamed != expected:
+                mismatch = next(
+                    (i for i, pair in enumerate(zip(streamed, expected)) if pair[0] != pair[1]),
+                    min(len(streamed), len(expected))
+                )
+                sys.exit(f"{label}: iter_sentences differs from split_sentence at sentence {mismatch}")
+            print(f"{label}: iter_sentences matches split_sentence ({len(expected):,} sentences, {elapsed:.2f} s)")
+
+    model = StubModel(args.latency, args.jitter, args.error_rate, args.seed, args.slow_rate, args.slow_factor)
+    hedger = Hedger(
+        percentile=args.hedge_percentile, min_delay=args.hedge_min_delay, budget=args.hedge_budget
+    ) if args.hedge else None
+    harness = Harness(model, args.rate, args.cooldown, hedger)
+    names = [name for name in args.scenarios.split(",") if name]
+
+    header = (f"{'corpus':>10} {'scenario':<12} {'units':>9} {'unit/s':>10} {'calls':>7} {'calls/1k':>9}"
+              f" {'p50 s':>7} {'p99 s':>7} {'peak MB':>8}")
+    print(header)
+    print("-" * len(header))
+    for label, text in corpora:
+        for name in names:
+            result = run_scenario(name, text, harness, memory=not args.no_memory)
+            result['corpus'] = label
+            peak = f"{result['peak_memory_mb']:.1f}" if result['peak_memory_mb'] is not None else "-"
+            print(
+                f"{label:>10} {name:<12} {result['units']:>9,} {result['units_per_second']:>10,.1f}"
+                f" {result['api_calls']:>7,} {result['calls_per_1k_chars']:>9.2f}"
+                f" {result['latency_p50']:>7.3f} {result['latency_p99']:>7.3f} {peak:>8}"
+            )
+            if args.json:
+                with open(args.json, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({**result, 'timestamp': time.time(), 'args': vars(args)}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
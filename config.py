@@ -0,0 +1,10 @@
+import streamlit as st
+
+
+def config_section(name: str) -> dict:
+    """A copy of the [name] table from secrets.toml, or {} when it is missing or unreadable"""
+    try:
+        return dict(st.secrets.get(name, {}))
+    except Exception:
+        # Không có secrets.toml (CLI, benchmark, worker process) -> dùng giá trị mặc định
+        return {}
@@ -0,0 +1,106 @@
+import os
+import pickle
+import re
+import threading
+from typing import Dict, Optional
+
+from config import config_section
+
+# Dòng CEDICT: 繁體 简体 [pin1 yin1] /nghĩa 1/nghĩa 2/
+CEDICT_LINE = re.compile(r'^(\S+)\s+(\S+)\s+\[([^\]]*)\]\s+/(.*)/\s*$')
+
+# Default dictionary files per target language. The Docker image downloads CC-CEDICT for English
+# outside /app (CEDICT_PATH), so a source bind mount does not hide it.
+# There is no bundled Vietnamese dictionary: point [dictionary] vi at a CEDICT-format file such as
+# CVDICT (vi = "data/CVDICT.u8"); without one, Vietnamese word lookups go to Gemini.
+DEFAULT_DICTIONARIES = {
+    "en": os.environ.get("CEDICT_PATH", "data/cedict_ts.u8"),
+}
+
+_dictionaries: Dict[str, Optional["CedictDictionary"]] = {}
+_dictionaries_lock = threading.Lock()
+
+
+class CedictDictionary:
+    """In-memory word -> gloss table built from a CEDICT-format file"""
+
+    def __init__(self, entries: Dict[str, str]):
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, word: str) -> Optional[str]:
+        return self.entries.get(word)
+
+    @staticmethod
+    def _senses(definitions: str) -> list:
+        return [
+            sense.strip() for sense in definitions.split('/')
+            if sense.strip() and not sense.startswith(('CL:', 'variant of', 'old variant of'))
+        ]
+
+    @classmethod
+    def parse(cls, lines, max_senses: int = 3) -> "CedictDictionary":
+        senses: Dict[str, list] = {}
+        for line in lines:
+            if line.startswith('#'):
+                continue
+            match = CEDICT_LINE.match(line.strip())
+            if not match:
+                continue
+            traditional, simplified, _, definitions = match.groups()
+            for word in (simplified, traditional):
+                word_senses = senses.setdefault(word, [])
+                for sense in cls._senses(definitions):
+                    if len(word_senses) >= max_senses:
+                        break
+                    if sense not in word_senses:
+                        word_senses.append(sense)
+
+        return cls({word: '; '.join(values) for word, values in senses.items() if values})
+
+    @classmethod
+    def from_file(cls, path: str, max_senses: int = 3) -> "CedictDictionary":
+        """Load a dictionary, reusing a pickled index next to the source when it is up to date"""
+        index_path = path + '.pkl'
+        try:
+            if os.path.getmtime(index_path) >= os.path.getmtime(path):
+                with open(index_path, 'rb') as f:
+                    return cls(pickle.load(f))
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+        with open(path, 'r', encoding='utf-8') as f:
+            dictionary = cls.parse(f, max_senses)
+
+        try:
+            with open(index_path, 'wb') as f:
+                pickle.dump(dictionary.entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            print(f"Could not write dictionary index {index_path}: {e}")
+        return dictionary
+
+
+def get_dictionary(target_lang: str) -> Optional[CedictDictionary]:
+    """Process-wide dictionary for a target language, or None if no file is configured"""
+    with _dictionaries_lock:
+        if target_lang in _dictionaries:
+            return _dictionaries[target_lang]
+
+        paths = config_section("dictionary")
+        path = paths.get(target_lang, DEFAULT_DICTIONARIES.get(target_lang))
+
+        dictionary = None
+        if path and os.path.exists(path):
+            try:
+                dictionary = CedictDictionary.from_file(path)
+                print(f"Dictionary loaded: {path} ({len(dictionary):,} words)")
+            except Exception as e:
+                print(f"Dictionary Error ({path}): {str(e)}")
+        else:
+            # Chỉ log một lần mỗi ngôn ngữ: kết quả None cũng được cache bên dưới
+            print(f"No dictionary for '{target_lang}' ({path or 'not configured'}); word lookups will use Gemini")
+
+        _dictionaries[target_lang] = dictionary
+        return dictionary
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+
+class Hedger:
+    """Decides when a slow request gets a duplicate ("hedge") and how many duplicates we can afford.
+
+    The hedge delay is a rolling percentile of recent request latencies (never below min_delay).
+    The budget works like a token bucket: every primary request earns `budget` tokens and every
+    hedge spends one, so hedges stay below that share of all requests.
+    """
+
+    def __init__(self, percentile: float = 0.95, min_delay: float = 0.5, budget: float = 0.05,
+                 window: int = 200, min_samples: int = 20, max_tokens: float = 10.0):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.budget = budget
+        self.min_samples = min_samples
+        self.max_tokens = max_tokens
+
+        self._latencies = deque(maxlen=window)
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def on_request(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.budget)
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples to judge"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        threshold = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+        return max(self.min_delay, threshold)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def refund(self) -> None:
+        """Give back a token taken by try_acquire for a hedge that was not sent"""
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + 1)
+
+    async def call(self, make_call, before_hedge=None, metrics=None):
+        """Await make_call(); if it is still running after delay(), race it against a second call.
+
+        The first successful response wins and the other call is cancelled; an error only
+        surfaces if every call failed. before_hedge (e.g. the rate limiter) is awaited before the
+        duplicate is sent.
+        """
+        self.on_request()
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(make_call())
+        tasks = {primary}
+        try:
+            delay = self.delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    if self.try_acquire():
+                        if before_hedge is not None:
+                            await before_hedge()
+                        if primary.done():
+                            # Request gốc xong trong lúc chờ rate limiter: không cần bản sao nữa
+                            self.refund()
+                        else:
+                            if metrics is not None:
+                                metrics.inc('hedges')
+                            tasks.add(asyncio.ensure_future(make_call()))
+                    elif metrics is not None:
+                        metrics.inc('hedges_over_budget')
+
+            error = None
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        # Tính từ lúc gửi request đầu: request được hedge luôn >= delay nên
+                        # percentile không bị kéo xuống bởi chính các lần hedge
+                        self.observe(time.perf_counter() - started)
+                        if task is not primary and metrics is not None:
+                            metrics.inc('hedge_wins')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def snapshot(self) -> dict:
+        delay = self.delay()
+        with self._lock:
+            return {
+                'delay': delay,
+                'samples': len(self._latencies),
+                'tokens': self._tokens,
+            }
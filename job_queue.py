@@ -0,0 +1,132 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from config import config_section
+from job_store import LEASE_SECONDS, JobBusyError, JobStore, get_job_store, is_leased
+from translate_book import iter_translate_file, job_params, create_html_block, render_document
+
+_queue = None
+_queue_lock = threading.Lock()
+
+ACTIVE_STATUSES = ('queued', 'running')
+# Gia hạn lease vài lần trong mỗi LEASE_SECONDS để một lần gia hạn trễ không làm mất job
+HEARTBEAT_SECONDS = LEASE_SECONDS / 4
+
+
+class JobQueue:
+    """Runs standard-mode translations on worker threads, independent of Streamlit reruns.
+
+    State lives in the JobStore, so the UI only polls it. Each running job is leased to this
+    queue's worker id and renewed by a heartbeat; jobs whose worker stopped renewing (a restart,
+    a crashed replica) are picked up again from their last checkpoint by any queue on the store.
+    """
+
+    def __init__(self, job_store: JobStore, max_workers: int = 2):
+        self.job_store = job_store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="translation-job")
+        self._active = set()
+        self._lock = threading.Lock()
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self._reclaim_stale()
+        threading.Thread(target=self._heartbeat_forever, daemon=True, name="translation-job-heartbeat").start()
+
+    def _reclaim_stale(self):
+        # Job của phiên foreground không lưu input: phiên đó tự chạy tiếp, không được lấy lại ở đây
+        for job in self.job_store.list_jobs(statuses=ACTIVE_STATUSES, with_input=True):
+            if not is_leased(job):
+                self._schedule(job['job_id'], job['params'])
+
+    def _heartbeat_forever(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                self.job_store.heartbeat(self.worker_id)
+                self._reclaim_stale()
+            except Exception as e:
+                print(f"Job heartbeat error: {str(e)}")
+
+    def submit(self, text: str, owner: str = '', include_english: bool = True,
+               second_language: str = "vi", pinyin_style: str = 'tone_marks') -> Tuple[str, bool]:
+        """(job_id, queued): queued is False when the same job is already running somewhere"""
+        text = text.strip()
+        params = job_params(include_english, second_language, pinyin_style)
+        job_id = JobStore.make_job_id(text, params)
+
+        with self._lock:
+            if job_id in self._active:
+                return job_id, False
+        if is_leased(self.job_store.get_job(job_id)):
+            return job_id, False
+        self.job_store.create_job(job_id, params, 0, status='queued', owner=owner, text=text)
+        self._schedule(job_id, params)
+        return job_id, True
+
+    def _schedule(self, job_id: str, params: dict):
+        with self._lock:
+            if job_id in self._active:
+                return
+            self._active.add(job_id)
+        self._executor.submit(self._run, job_id, params)
+
+    def _run(self, job_id: str, params: dict):
+        try:
+            text = self.job_store.get_input(job_id)
+            if text is None:
+                raise ValueError("job input is missing")
+            # Chỉ cần chạy hết generator: từng lô đã được lưu vào checkpoint
+            for _ in iter_translate_file(
+                text,
+                include_english=params['include_english'],
+                second_language=params['second_language'],
+                pinyin_style=params['pinyin_style'],
+                job_store=self.job_store,
+                worker=self.worker_id
+            ):
+                pass
+        except JobBusyError:
+            # Worker khác đã nhận job trước: để nó chạy tiếp
+            pass
+        except Exception as e:
+            print(f"Job {job_id} failed: {str(e)}")
+            self.job_store.set_status(job_id, 'failed')
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def status(self, job_id: str) -> Optional[dict]:
+        job = self.job_store.get_job(job_id)
+        if job is not None:
+            finished = job['done'] + job['failed']
+            job['progress'] = min(100.0, finished / job['total'] * 100) if job['total'] else 0.0
+        return job
+
+    def list_jobs(self, owner: str) -> list:
+        return [self.status(job['job_id']) for job in self.job_store.list_jobs(owner=owner)]
+
+    def render(self, job_id: str) -> Optional[str]:
+        """HTML page for everything the job has produced so far"""
+        job = self.job_store.get_job(job_id)
+        if job is None:
+            return None
+        results = self.job_store.load_results(job_id, include_failed=True)
+        include_english = job['params']['include_english']
+        return render_document(create_html_block(results[i], include_english) for i in sorted(results))
+
+
+def get_job_queue() -> Optional[JobQueue]:
+    """Process-wide job queue, or None when there is no job store to back it"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            job_store = get_job_store()
+            if job_store is None:
+                return None
+            max_workers = config_section("jobs").get("max_workers", 2)
+            _queue = JobQueue(job_store, max_workers=max_workers)
+        return _queue
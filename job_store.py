@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from config import config_section
+
+_store = None
+_store_lock = threading.Lock()
+
+# Worker nào không gửi heartbeat trong khoảng này thì job của nó được coi là bỏ dở
+LEASE_SECONDS = 120
+
+
+class JobBusyError(Exception):
+    """The job is being run by another live worker"""
+
+
+def is_error_result(result) -> bool:
+    """True if any translation in a (index, chunk, pinyin, *translations) result is an error marker"""
+    return any(
+        isinstance(value, str) and value.startswith(("[Error", "[Sys Error"))
+        for value in result[3:]
+    )
+
+
+class JobStore:
+    """Checkpoint store for translation jobs: one row per finished chunk"""
+
+    def __init__(self, path: str = ".cache/jobs.db", max_age_days: float = 7):
+        self.path = path
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY,"
+            " params TEXT NOT NULL,"
+            " total INTEGER NOT NULL,"
+            " status TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " updated REAL NOT NULL,"
+            " owner TEXT NOT NULL DEFAULT '',"
+            " input TEXT,"
+            " worker TEXT,"
+            " heartbeat REAL)"
+        )
+        # Bảng tạo từ phiên bản cũ chưa có cột owner/input/worker/heartbeat
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if 'owner' not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+        if 'input' not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN input TEXT")
+        if 'worker' not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN worker TEXT")
+        if 'heartbeat' not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat REAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_results ("
+            " job_id TEXT NOT NULL,"
+            " chunk_index INTEGER NOT NULL,"
+            " result TEXT NOT NULL,"
+            " failed INTEGER NOT NULL,"
+            " PRIMARY KEY (job_id, chunk_index))"
+        )
+        conn.commit()
+        self.purge(max_age_days)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_job_id(text: str, params: dict) -> str:
+        """Same text with the same settings always maps to the same job"""
+        raw = text + "\x1f" + json.dumps(params, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def create_job(self, job_id: str, params: dict, total: int, status: str = 'running',
+                   owner: str = '', text: str = None) -> None:
+        """Register a job, or reset the status and size of an existing one"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR IGNORE INTO jobs (job_id, params, total, status, created, updated, owner, input)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, json.dumps(params), total, status, now, now, owner, text)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = ?, total = MAX(total, ?), updated = ? WHERE job_id = ?",
+            (status, total, now, job_id)
+        )
+        if owner:
+            conn.execute("UPDATE jobs SET owner = ? WHERE job_id = ?", (owner, job_id))
+        if text is not None:
+            conn.execute("UPDATE jobs SET input = ? WHERE job_id = ?", (text, job_id))
+        conn.commit()
+
+    JOB_COLUMNS = (
+        "SELECT job_id, params, total, status, created, updated, owner, worker, heartbeat,"
+        " (SELECT COUNT(*) FROM chunk_results c WHERE c.job_id = jobs.job_id AND failed = 0),"
+        " (SELECT COUNT(*) FROM chunk_results c WHERE c.job_id = jobs.job_id AND failed = 1)"
+        " FROM jobs"
+    )
+
+    @staticmethod
+    def _job_from_row(row) -> dict:
+        job_id, params, total, status, created, updated, owner, worker, heartbeat, done, failed = row
+        return {
+            'job_id': job_id,
+            'params': json.loads(params),
+            'total': total,
+            'status': status,
+            'created': created,
+            'updated': updated,
+            'owner': owner,
+            'worker': worker,
+            'heartbeat': heartbeat,
+            'done': done,
+            'failed': failed,
+        }
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        row = self._connect().execute(self.JOB_COLUMNS + " WHERE job_id = ?", (job_id,)).fetchone()
+        return self._job_from_row(row) if row is not None else None
+
+    def list_jobs(self, owner: str = None, statuses: tuple = None, with_input: bool = False) -> list:
+        """Jobs newest first, optionally filtered by owner and status (with_input: background jobs only)"""
+        query, args = self.JOB_COLUMNS + " WHERE 1 = 1", []
+        if with_input:
+            query += " AND input IS NOT NULL"
+        if owner is not None:
+            query += " AND owner = ?"
+            args.append(owner)
+        if statuses:
+            query += f" AND status IN ({', '.join('?' * len(statuses))})"
+            args.extend(statuses)
+        rows = self._connect().execute(query + " ORDER BY created DESC", args).fetchall()
+        return [self._job_from_row(row) for row in rows]
+
+    def claim_job(self, job_id: str, worker: str, lease: float = LEASE_SECONDS) -> bool:
+        """Take the job for worker unless another worker holds a live lease on it"""
+        now = time.time()
+        conn = self._connect()
+        claimed = conn.execute(
+            "UPDATE jobs SET worker = ?, heartbeat = ? WHERE job_id = ?"
+            " AND (worker IS NULL OR worker = ? OR heartbeat IS NULL OR heartbeat < ?)",
+            (worker, now, job_id, worker, now - lease)
+        ).rowcount
+        conn.commit()
+        return claimed == 1
+
+    def release_job(self, job_id: str, worker: str) -> None:
+        conn = self._connect()
+        conn.execute("UPDATE jobs SET worker = NULL WHERE job_id = ? AND worker = ?", (job_id, worker))
+        conn.commit()
+
+    def heartbeat(self, worker: str) -> None:
+        """Renew the lease on every job worker holds"""
+        conn = self._connect()
+        conn.execute("UPDATE jobs SET heartbeat = ? WHERE worker = ?", (time.time(), worker))
+        conn.commit()
+
+    def get_input(self, job_id: str) -> Optional[str]:
+        row = self._connect().execute("SELECT input FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def save_results(self, job_id: str, results: list) -> None:
+        """Persist a batch of finished chunks in one transaction"""
+        conn = self._connect()
+        conn.executemany(
+            "INSERT OR REPLACE INTO chunk_results (job_id, chunk_index, result, failed) VALUES (?, ?, ?, ?)",
+            [
+                (job_id, result[0], json.dumps(list(result), ensure_ascii=False), int(is_error_result(result)))
+                for result in results
+            ]
+        )
+        now = time.time()
+        conn.execute("UPDATE jobs SET updated = ?, heartbeat = ? WHERE job_id = ?", (now, now, job_id))
+        conn.commit()
+
+    def load_results(self, job_id: str, include_failed: bool = False) -> Dict[int, tuple]:
+        query = "SELECT chunk_index, result FROM chunk_results WHERE job_id = ?"
+        if not include_failed:
+            query += " AND failed = 0"
+        rows = self._connect().execute(query, (job_id,)).fetchall()
+        return {index: tuple(json.loads(result)) for index, result in rows}
+
+    def set_status(self, job_id: str, status: str) -> None:
+        conn = self._connect()
+        conn.execute("UPDATE jobs SET status = ?, updated = ? WHERE job_id = ?", (status, time.time(), job_id))
+        conn.commit()
+
+    def purge(self, max_age_days: float) -> None:
+        """Drop checkpoints that have not been touched for max_age_days"""
+        cutoff = time.time() - max_age_days * 86400
+        conn = self._connect()
+        conn.execute(
+            "DELETE FROM chunk_results WHERE job_id IN (SELECT job_id FROM jobs WHERE updated < ?)", (cutoff,)
+        )
+        conn.execute("DELETE FROM jobs WHERE updated < ?", (cutoff,))
+        conn.commit()
+
+
+def is_leased(job: Optional[dict], lease: float = LEASE_SECONDS) -> bool:
+    """True while a live worker is running the job"""
+    return bool(job and job['worker'] and job['heartbeat'] and job['heartbeat'] >= time.time() - lease)
+
+
+def get_job_store() -> Optional[JobStore]:
+    """Process-wide job store, or None if checkpoints are disabled or unavailable"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            config = config_section("jobs")
+            if not config.get("enabled", True):
+                return None
+            try:
+                _store = JobStore(
+                    path=config.get("path", ".cache/jobs.db"),
+                    max_age_days=config.get("max_age_days", 7)
+                )
+            except Exception as e:
+                print(f"Job Store Error: {str(e)}")
+                return None
+        return _store
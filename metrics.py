@@ -0,0 +1,173 @@
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from config import config_section
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+# Giây; bucket cuối (inf) gom mọi request chậm hơn
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, math.inf)
+
+
+class Histogram:
+    """Fixed-bucket histogram; quantiles are interpolated inside the bucket that holds them"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if self.buckets[i] != math.inf else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-2]
+
+    def snapshot(self) -> dict:
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == math.inf else str(bound)] = cumulative
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': buckets,
+        }
+
+
+class Metrics:
+    """Process-wide counters, gauges and latency histograms for translation requests and jobs"""
+
+    def __init__(self):
+        self.started = time.time()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def add_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def in_flight(self, name: str = "in_flight"):
+        """Gauge of calls currently inside the block (works around awaits too)"""
+        self.add_gauge(name, 1)
+        try:
+            yield
+        finally:
+            self.add_gauge(name, -1)
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {name: histogram.snapshot() for name, histogram in self._histograms.items()}
+
+        hits = counters.get('cache_hits_memory', 0) + counters.get('cache_hits_disk', 0)
+        lookups = hits + counters.get('cache_misses', 0)
+        return {
+            'timestamp': time.time(),
+            'uptime': time.time() - self.started,
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': histograms,
+            'cache_hit_ratio': hits / lookups if lookups else 0.0,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix: str = "translator_") -> str:
+        """Snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            lines += [f"# TYPE {prefix}{name}_total counter", f"{prefix}{name}_total {value}"]
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines += [f"# TYPE {prefix}{name} gauge", f"{prefix}{name} {value}"]
+        for name, histogram in sorted(snapshot['histograms'].items()):
+            lines.append(f"# TYPE {prefix}{name} histogram")
+            for bound, count in histogram['buckets'].items():
+                lines.append(f'{prefix}{name}_bucket{{le="{bound}"}} {count}')
+            lines += [f"{prefix}{name}_sum {histogram['sum']}", f"{prefix}{name}_count {histogram['count']}"]
+        lines += [f"# TYPE {prefix}cache_hit_ratio gauge", f"{prefix}cache_hit_ratio {snapshot['cache_hit_ratio']}"]
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            # Gauge in_flight phản ánh request đang chạy, không reset
+            self.started = time.time()
+
+    def export_forever(self, path: str, interval: float) -> None:
+        """Rewrite path with the Prometheus text every interval seconds (textfile collector)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        while True:
+            try:
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(self.to_prometheus())
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Metrics export error: {str(e)}")
+            time.sleep(interval)
+
+
+def get_metrics() -> Metrics:
+    """Process-wide metrics; with [metrics] export_path they are also written to a file periodically"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+            config = config_section("metrics")
+            export_path = config.get("export_path")
+            if export_path:
+                threading.Thread(
+                    target=_metrics.export_forever,
+                    args=(export_path, config.get("export_interval", 15)),
+                    name="metrics-export",
+                    daemon=True
+                ).start()
+        return _metrics
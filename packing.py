@@ -0,0 +1,79 @@
+from collections import deque
+
+from config import config_section
+
+# Mục tiêu mỗi request: đủ lớn để chia đều phần prompt cố định, đủ nhỏ để model không bỏ sót đoạn
+DEFAULT_BUDGET_TOKENS = 1500
+DEFAULT_MAX_SEGMENTS = 40
+# Chỉ lùi về ranh giới đoạn văn nếu request vẫn đầy ít nhất chừng này phần ngân sách
+MIN_FILL = 0.5
+
+OPEN_QUOTES = '“「『'
+CLOSE_QUOTES = '”」』'
+
+
+def packing_config() -> tuple:
+    """(budget_tokens, max_segments) from [packing] in secrets, else the defaults"""
+    config = config_section("packing")
+    return (
+        config.get("budget_tokens", DEFAULT_BUDGET_TOKENS),
+        config.get("max_segments", DEFAULT_MAX_SEGMENTS),
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count: one per CJK character, one per four other characters"""
+    # Chữ Hán chiếm 3 byte UTF-8, ASCII 1 byte: đếm mà không cần vòng lặp Python
+    wide = (len(text.encode('utf-8')) - len(text)) // 2
+    return wide + (len(text) - wide + 3) // 4
+
+
+def paragraph_breaks(text: str, spans: list) -> set:
+    """Indices i such that a line break separates sentence i from sentence i + 1"""
+    return {
+        i for i in range(len(spans) - 1)
+        if '\n' in text[spans[i][2]:spans[i + 1][1]]
+    }
+
+
+def pack_units(texts: list, breaks=(), budget_tokens: int = DEFAULT_BUDGET_TOKENS,
+               max_segments: int = DEFAULT_MAX_SEGMENTS) -> list:
+    """Group adjacent texts into (start, stop) request units of about budget_tokens each.
+
+    A unit never ends inside an open “「『 quote (quotes are closed at paragraph breaks) unless the
+    quote alone exceeds the budget, and it ends at the last paragraph break (an index in breaks)
+    when that still fills half the budget.
+    """
+    units = []
+    start = 0
+    base = total = 0
+    depth = 0
+    # (vị trí có thể cắt, tổng token tới đó, có phải cuối đoạn văn)
+    cuts = deque()
+
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        while i > start and (total - base + cost > budget_tokens or i - start >= max_segments):
+            stop, stop_total = i, total
+            if cuts:
+                stop, stop_total = cuts[-1][0], cuts[-1][1]
+                for position, position_total, paragraph in reversed(cuts):
+                    if paragraph and position_total - base >= budget_tokens * MIN_FILL:
+                        stop, stop_total = position, position_total
+                        break
+            units.append((start, stop))
+            start, base = stop, stop_total
+            while cuts and cuts[0][0] <= start:
+                cuts.popleft()
+
+        total += cost
+        depth = max(0, depth + sum(map(text.count, OPEN_QUOTES)) - sum(map(text.count, CLOSE_QUOTES)))
+        if i in breaks:
+            # Một ngoặc quên đóng không được chặn mọi điểm cắt phía sau
+            depth = 0
+        if depth == 0:
+            cuts.append((i + 1, total, i in breaks))
+
+    if start < len(texts):
+        units.append((start, len(texts)))
+    return units
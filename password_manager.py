@@ -1,97 +1,142 @@
 import json
+import hashlib
+import threading
 from datetime import datetime
+from types import MappingProxyType
 import streamlit as st
-from collections import defaultdict
 from pydantic import BaseModel, Field
-from typing import Dict, Any
+from typing import Dict, Any, Mapping, NamedTuple, Optional
+from usage_store import get_usage_store
 
 # Pydantic model for Usage Stats
 class UserUsage(BaseModel):
     date: str
     count: int
 
+
+def hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class AuthIndex(NamedTuple):
+    """Read-only lookup tables built once from secrets; every login/quota check is a dict lookup"""
+    admin_digest: Optional[str]
+    key_names: Mapping[str, str]
+    tiers: Mapping[str, str]
+    limits: Mapping[str, int]
+    default_limit: int
+    premium_limit: int
+
+
+def build_auth_index(secrets) -> AuthIndex:
+    admin_pwd = secrets.get("admin_password")
+    api_keys = secrets.get("api_keys", {})
+    user_tiers = secrets.get("user_tiers", {})
+
+    # Define limits (Support old config or new standard)
+    usage_limits = secrets.get("usage_limits", {})
+    default_limit = usage_limits.get("default_daily_limit", 30000)
+    premium_limit = usage_limits.get("premium_daily_limit", 50000)
+
+    admin_digest = hash_key(str(admin_pwd)) if admin_pwd else None
+    key_names, tiers, limits = {}, {}, {}
+    if admin_digest:
+        # Admin gets premium limit
+        key_names[admin_digest] = "admin"
+        tiers["admin"] = "admin"
+        limits[admin_digest] = premium_limit
+    for key_name, key_value in api_keys.items():
+        digest = hash_key(str(key_value))
+        # Trùng key: giữ tên đầu tiên như vòng lặp cũ
+        if digest in key_names:
+            continue
+        tier = user_tiers.get(key_name, "default")
+        key_names[digest] = key_name
+        tiers[key_name] = tier
+        limits[digest] = premium_limit if tier == "premium" else default_limit
+
+    return AuthIndex(
+        admin_digest=admin_digest,
+        key_names=MappingProxyType(key_names),
+        tiers=MappingProxyType(tiers),
+        limits=MappingProxyType(limits),
+        default_limit=default_limit,
+        premium_limit=premium_limit
+    )
+
+
+_index = None
+_index_lock = threading.Lock()
+_listening = False
+
+
+def _invalidate_auth_index(*args, **kwargs):
+    global _index
+    _index = None
+
+
+def get_auth_index() -> AuthIndex:
+    """Process-wide auth index, rebuilt after secrets.toml changes"""
+    global _index, _listening
+    index = _index
+    if index is not None:
+        return index
+    with _index_lock:
+        if _index is None:
+            if not _listening:
+                st.secrets.file_change_listener.connect(_invalidate_auth_index, weak=False)
+                _listening = True
+            _index = build_auth_index(st.secrets)
+        return _index
+
+
 class PasswordManager:
     def __init__(self):
-        # Get API keys and their metadata from secrets
-        self.api_keys = st.secrets.get("api_keys", {})
-        self.user_tiers = st.secrets.get("user_tiers", {})
-        
-        # Define limits (Support old config or new standard)
-        usage_limits = st.secrets.get("usage_limits", {})
-        self.default_limit = usage_limits.get("default_daily_limit", 30000)
-        self.premium_limit = usage_limits.get("premium_daily_limit", 50000)
-        
-        # Initialize usage tracking in session state if not exists
-        if 'usage_tracking' not in st.session_state:
-            st.session_state.usage_tracking = {}
-            
-        # Add key name mapping in session state
-        if 'key_name_mapping' not in st.session_state:
-            st.session_state.key_name_mapping = {}
-            
+        # Build (or reuse) the auth index now so a broken secrets file fails here
+        get_auth_index()
+
+        # Usage is shared by every session and replica, not kept in session state
+        self.usage_store = get_usage_store()
+
+    @property
+    def index(self) -> AuthIndex:
+        return get_auth_index()
+
+    @property
+    def user_tiers(self):
+        return self.index.tiers
+
+    @property
+    def default_limit(self):
+        return self.index.default_limit
+
+    @property
+    def premium_limit(self):
+        return self.index.premium_limit
+
     def check_password(self, password):
-        """Check if password is valid and map key name"""
+        """Check if password is valid (admin key or one of the api_keys)"""
         if not password:  # Handle empty password
             return False
-        
-        # Get admin password
-        admin_pwd = st.secrets.get("admin_password")
-        api_keys = st.secrets.get("api_keys", {})
-        
-        # For admin login
-        if password == admin_pwd and self.is_admin(password):
-            st.session_state.key_name_mapping[password] = "admin"
-            return True
-        
-        # For regular user login - check value and store key name
-        for key_name, key_value in api_keys.items():
-            if password == key_value:
-                # Store the mapping of value to key name
-                st.session_state.key_name_mapping[password] = key_name
-                return True
-                
-        return False
+        return hash_key(password) in self.index.key_names
         
     def is_admin(self, password):
         """Check if the user is admin"""
-        admin_pwd = st.secrets.get("admin_password")
-        if not admin_pwd or not password:
+        admin_digest = self.index.admin_digest
+        if not admin_digest or not password:
             return False
-        return password == admin_pwd
+        return hash_key(password) == admin_digest
 
     def get_user_limit(self, user_key):
         """Get daily limit for a user based on their tier"""
+        index = self.index
         if not user_key:
-            return self.default_limit
-            
-        # Admin gets premium limit
-        if user_key == st.secrets.get("admin_password"):
-            return self.premium_limit
-            
-        # Get user's key name
-        key_name = self.get_key_name(user_key)
-        
-        # Check user's tier
-        user_tier = self.user_tiers.get(key_name, "default")
-        
-        if user_tier == "premium":
-            return self.premium_limit
-        return self.default_limit
-
-    def get_usage_stats(self):
-        """Get usage statistics for admin view"""
-        stats = {
-            'total_users': len(st.session_state.usage_tracking),
-            'daily_stats': defaultdict(int),
-            'user_stats': defaultdict(lambda: defaultdict(int))
-        }
-        
-        for user, data in st.session_state.usage_tracking.items():
-            for date, count in data.items():
-                stats['daily_stats'][date] += count
-                stats['user_stats'][user][date] = count
-                
-        return stats
+            return index.default_limit
+        return index.limits.get(hash_key(user_key), index.default_limit)
+
+    def get_user_tier(self, user_key):
+        """Tier name of a user key ("default" for unknown keys)"""
+        return self.index.tiers.get(self.get_key_name(user_key), "default")
 
     def check_usage_limit(self, user_key, new_chars_count):
         """Check if user has exceeded their daily limit"""
@@ -106,23 +151,14 @@ def track_usage(self, user_key, chars_count):
             
         key_name = self.get_key_name(user_key)
         today = datetime.now().date().isoformat()
-        
-        if key_name not in st.session_state.usage_tracking:
-            st.session_state.usage_tracking[key_name] = {}
-            
-        if today not in st.session_state.usage_tracking[key_name]:
-            st.session_state.usage_tracking[key_name][today] = 0
-            
-        st.session_state.usage_tracking[key_name][today] += chars_count
+        self.usage_store.increment(key_name, today, chars_count, tier=self.get_user_tier(user_key))
         
     def get_daily_usage(self, user_key):
         """Get user's translation usage for today using key name"""
         key_name = self.get_key_name(user_key)
         today = datetime.now().date().isoformat()
-        if key_name not in st.session_state.usage_tracking:
-            return 0
-        return st.session_state.usage_tracking[key_name].get(today, 0)
+        return self.usage_store.get(key_name, today)
 
     def get_key_name(self, password):
         """Get the key name for a password"""
-        return st.session_state.key_name_mapping.get(password, password)
+        return self.index.key_names.get(hash_key(password), password) if password else password
@@ -0,0 +1,115 @@
+import re
+from bisect import bisect_right
+from functools import lru_cache
+
+import pypinyin
+from pypinyin.constants import RE_HANS
+from pypinyin.contrib.tone_convert import tone_to_tone3
+
+# Cụm chữ Hán liên tiếp (cùng bảng ký tự pypinyin dùng)
+HANS_RUN = re.compile(RE_HANS.pattern.lstrip('^').rstrip('$'))
+
+PINYIN_STYLES = {
+    'tone_marks': pypinyin.TONE,
+    'tone_numbers': pypinyin.TONE3,
+}
+
+
+@lru_cache(maxsize=None)
+def tone3_reading(reading: str) -> str:
+    """nǐ -> ni3; memoized so a document only converts each distinct syllable once"""
+    return tone_to_tone3(reading)
+
+
+@lru_cache(maxsize=100000)
+def run_readings(run: str) -> tuple:
+    """Tone-mark readings for a run of Chinese characters, memoized per process"""
+    try:
+        return tuple(item[0] for item in pypinyin.pinyin(run, style=pypinyin.TONE))
+    except Exception as e:
+        print(f"Pinyin Error: {e}")
+        return ()
+
+
+@lru_cache(maxsize=None)
+def char_reading(char: str, style: str = 'tone_marks') -> str:
+    """Reading of a single character, memoized per process for both tone styles"""
+    try:
+        reading = pypinyin.pinyin(char, style=pypinyin.TONE)[0][0]
+    except Exception:
+        return char
+    return tone3_reading(reading) if style == 'tone_numbers' else reading
+
+
+class PinyinIndex:
+    """Pinyin for a whole document in one pass, addressable by character offset"""
+
+    def __init__(self, text: str, style: str = 'tone_marks'):
+        self.text = text
+        self.style = style
+        # items: (start, end, reading); reading is None for runs of non-Chinese text
+        self.items = self._annotate(text)
+        self.starts = [item[0] for item in self.items]
+
+    @classmethod
+    def from_items(cls, text: str, style: str, items: list) -> "PinyinIndex":
+        """Index assembled from items computed elsewhere (e.g. per shard in worker processes)"""
+        index = cls.__new__(cls)
+        index.text = text
+        index.style = style
+        index.items = items
+        index.starts = [item[0] for item in items]
+        return index
+
+    @staticmethod
+    def _annotate(text: str) -> list:
+        items = []
+        offset = 0
+        # pypinyin xử lý từng cụm chữ Hán độc lập, nên có thể nhớ kết quả theo cụm
+        for match in HANS_RUN.finditer(text):
+            start, end = match.span()
+            if start > offset:
+                items.append((offset, start, None))
+            run = match.group()
+            readings = (char_reading(run),) if len(run) == 1 else run_readings(run)
+            if len(readings) != len(run):
+                readings = tuple(char_reading(char) for char in run)
+            items.extend((start + i, start + i + 1, reading) for i, reading in enumerate(readings))
+            offset = end
+        if offset < len(text):
+            items.append((offset, len(text), None))
+        return items
+
+    def slice(self, start: int, end: int) -> str:
+        """Pinyin for text[start:end], formatted like convert_to_pinyin"""
+        parts = []
+        position = max(0, bisect_right(self.starts, start) - 1)
+        while position < len(self.items):
+            item_start, item_end, reading = self.items[position]
+            if item_start >= end:
+                break
+            if reading is None:
+                run = self.text[max(item_start, start):min(item_end, end)]
+                if run:
+                    if parts and parts[-1][1]:
+                        parts[-1] = (parts[-1][0] + run, True)
+                    else:
+                        parts.append((run, True))
+            elif item_start >= start:
+                if self.style == 'tone_numbers':
+                    reading = tone3_reading(reading)
+                parts.append((reading, False))
+            position += 1
+        return ' '.join(part for part, _ in parts)
+
+
+def annotate_chunks(chunks: list, style: str = 'tone_marks') -> list:
+    """Pinyin for each chunk from a single pass over all of them"""
+    # Nối bằng '\n' để pypinyin không ghép từ qua ranh giới câu
+    index = PinyinIndex('\n'.join(chunks), style)
+    pinyins = []
+    offset = 0
+    for chunk in chunks:
+        pinyins.append(index.slice(offset, offset + len(chunk)))
+        offset += len(chunk) + 1
+    return pinyins
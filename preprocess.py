@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import segmenter
+from config import config_section
+from pinyin_index import PinyinIndex, annotate_chunks
+
+# Văn bản ngắn hơn ngưỡng này xử lý luôn trong tiến trình hiện tại
+PARALLEL_MIN_CHARS = 200000
+SHARD_CHARS = 50000
+MAX_WORKERS = 4
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    """Load jieba's dictionary once per worker instead of on the first shard"""
+    segmenter.warm_up()
+
+
+def get_pool():
+    """Process-wide pool for CPU-bound preprocessing, or None when disabled"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            config = config_section("preprocess")
+            # Mỗi worker nạp từ điển jieba riêng (~100MB): chỉ bật khi cấu hình, tối đa MAX_WORKERS
+            workers = min(config.get("workers", 0), MAX_WORKERS, os.cpu_count() or 1)
+            if workers < 2:
+                return None
+            # spawn: không fork tiến trình đang chạy gRPC/threads của Streamlit
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return _pool
+
+
+def shard_lines(text: str, shard_chars: int = SHARD_CHARS) -> list:
+    """Cut text at line breaks into (offset, shard) pieces of roughly shard_chars"""
+    shards = []
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start + shard_chars)
+        end = len(text) if end == -1 else end + 1
+        shards.append((start, text[start:end]))
+        start = end
+    return shards
+
+
+def _annotate_shard(chunks: list, style: str) -> list:
+    return annotate_chunks(chunks, style)
+
+
+def _segment_shard(offset: int, shard: str) -> list:
+    from translate_book import segment_paragraphs
+    return [(word, offset + start, offset + end) for word, start, end in segment_paragraphs(shard)]
+
+
+def _pinyin_shard(offset: int, shard: str) -> list:
+    return [(offset + start, offset + end, reading) for start, end, reading in PinyinIndex(shard).items]
+
+
+def split_document_spans(text: str) -> list:
+    """(chunk, start, end) sentences of text, always split in this process.
+
+    Sentence merging depends on quote and length state carried across the whole text, so shards
+    would split differently; checkpoints are keyed by chunk index and must see the same chunks
+    whatever the pool size.
+    """
+    from sentence_stream import iter_sentences
+    return list(iter_sentences([text]))
+
+
+def annotate_chunks_parallel(chunks: list, style: str = 'tone_marks') -> list:
+    """annotate_chunks with groups of chunks converted in worker processes"""
+    pool = get_pool() if sum(map(len, chunks)) >= PARALLEL_MIN_CHARS else None
+    if pool is None:
+        return annotate_chunks(chunks, style)
+
+    groups, group, size = [], [], 0
+    for chunk in chunks:
+        group.append(chunk)
+        size += len(chunk)
+        if size >= SHARD_CHARS:
+            groups.append(group)
+            group, size = [], 0
+    if group:
+        groups.append(group)
+    results = pool.map(_annotate_shard, groups, [style] * len(groups))
+    return [pinyin for pinyins in results for pinyin in pinyins]
+
+
+def segment_document(text: str) -> list:
+    """segment_paragraphs with line shards tokenized in worker processes (same offsets)"""
+    from translate_book import segment_paragraphs
+    pool = get_pool() if len(text) >= PARALLEL_MIN_CHARS else None
+    if pool is None:
+        return segment_paragraphs(text)
+
+    # Bỏ đúng một '\n' cuối mỗi mảnh: đó là ranh giới dòng, không phải dòng trống
+    shards = [
+        (offset, shard[:-1] if shard.endswith('\n') else shard)
+        for offset, shard in shard_lines(text)
+    ]
+    words = []
+    for shard_words in pool.map(_segment_shard, *zip(*shards)):
+        words.extend(shard_words)
+    if text.endswith('\n'):
+        words.append(('\n', len(text), len(text)))
+    return words
+
+
+def pinyin_document(text: str, style: str = 'tone_marks'):
+    """PinyinIndex for the whole text, with line shards converted in worker processes"""
+    pool = get_pool() if len(text) >= PARALLEL_MIN_CHARS else None
+    if pool is None:
+        return PinyinIndex(text, style)
+
+    shards = shard_lines(text)
+    items = []
+    for shard_items in pool.map(_pinyin_shard, *zip(*shards)):
+        items.extend(shard_items)
+    return PinyinIndex.from_items(text, style, items)
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose rate follows AIMD: grows while calls succeed, halves on 429"""
+
+    def __init__(self, rate: float = 2.0, min_rate: float = 0.2, max_rate: float = 20.0,
+                 burst: float = 4.0, increase: float = 0.05, decrease: float = 0.5,
+                 cooldown: float = 5.0):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+
+        self._rate = min(max(rate, min_rate), max_rate)
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        # Tăng mỗi lần bắt đầu cooldown, để người đang chờ biết phải xếp hàng lại
+        self._epoch = 0
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self, epoch: int = None) -> tuple:
+        """Take one token (possibly on credit); return how long the caller must wait and the cooldown epoch.
+
+        With the epoch of an earlier reservation, nothing is taken unless a 429 cooldown started
+        since then: the caller then queues again behind the cooldown.
+        """
+        with self._lock:
+            if epoch == self._epoch:
+                return 0.0, epoch
+            now = time.monotonic()
+            # Không tích token trong lúc cooldown: hàng đợi được giãn ra sau cooldown thay vì dồn một lúc
+            refill_from = max(self._updated, self._blocked_until)
+            self._tokens = min(self.burst, self._tokens + max(0.0, now - refill_from) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+            wait += max(0.0, self._blocked_until - now)
+            if wait > 0:
+                self._waiting += 1
+            return wait, self._epoch
+
+    def _release_waiter(self):
+        with self._lock:
+            self._waiting -= 1
+
+    def acquire(self):
+        """Block the calling thread until a request may be sent"""
+        wait, epoch = self._reserve()
+        # Sau mỗi lần ngủ kiểm tra lại: có thể đã có 429 trong lúc chờ
+        while wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                self._release_waiter()
+            wait, epoch = self._reserve(epoch)
+
+    async def acquire_async(self):
+        """Async counterpart of acquire"""
+        wait, epoch = self._reserve()
+        while wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._release_waiter()
+            wait, epoch = self._reserve(epoch)
+
+    def on_success(self):
+        with self._lock:
+            self._rate = min(self.max_rate, self._rate + self.increase)
+
+    def on_rate_limited(self):
+        """Back off for everyone; concurrent 429s inside one cooldown count once"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return
+            self._rate = max(self.min_rate, self._rate * self.decrease)
+            # Xoá nợ token: mọi người đang chờ sẽ xếp hàng lại sau cooldown (xem _reserve)
+            self._tokens = 0.0
+            self._blocked_until = now + self.cooldown
+            self._epoch += 1
+            print(f"Rate limit (429). Backing off to {self._rate:.2f} req/s for {self.cooldown:.1f}s")
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'rate': self._rate,
+                'queue_depth': self._waiting,
+                'blocked_for': max(0.0, self._blocked_until - time.monotonic()),
+            }
@@ -0,0 +1,63 @@
+import os
+import sys
+import threading
+import time
+
+import jieba
+
+from config import config_section
+
+_ready = threading.Event()
+_lock = threading.Lock()
+_started = False
+
+
+def _config() -> dict:
+    return config_section("jieba")
+
+
+def warm_up() -> None:
+    """Load jieba's prefix dictionary (and the optional user dictionary) once per process.
+
+    The prefix dictionary is deserialized from a cache file kept under cache_dir, so after the
+    first build (e.g. at image build time) loading it skips parsing the dictionary text.
+    """
+    if _ready.is_set():
+        return
+    with _lock:
+        if _ready.is_set():
+            return
+        config = _config()
+        # Image Docker đặt JIEBA_CACHE_DIR ngoài /app để bind mount mã nguồn không che mất cache
+        cache_dir = config.get("cache_dir", os.environ.get("JIEBA_CACHE_DIR", ".cache"))
+        os.makedirs(cache_dir, exist_ok=True)
+        jieba.dt.tmp_dir = cache_dir
+        jieba.dt.cache_file = "jieba.cache"
+
+        start = time.perf_counter()
+        jieba.initialize()
+        user_dict = config.get("user_dict")
+        if user_dict and os.path.exists(user_dict):
+            jieba.load_userdict(user_dict)
+        print(f"Segmenter ready in {time.perf_counter() - start:.2f}s")
+        _ready.set()
+
+
+def warm_up_async() -> None:
+    """Start warm_up on a daemon thread (at most once per process)"""
+    global _started
+    with _lock:
+        if _started or _ready.is_set():
+            return
+        _started = True
+    threading.Thread(target=warm_up, name="segmenter-warm-up", daemon=True).start()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+if __name__ == "__main__":
+    # Dùng khi build image: tạo sẵn file cache cho các tiến trình sau
+    warm_up()
+    sys.exit(0)
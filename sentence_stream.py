@@ -0,0 +1,127 @@
+import codecs
+import re
+from typing import Iterable, Iterator, Tuple, Union
+
+# Cùng bộ dấu câu / ngoặc với split_sentence trong translate_book.py
+DELIMITERS = '。！？，：；.!?,'
+CLOSERS = '」"』\'）)'
+OPENERS = '「""『\'（('
+QUOTES = '"「」『』'
+MIN_LENGTH = 20
+
+# Nhóm dấu câu mà re.split của split_sentence dùng làm chỗ cắt: chỉ tìm nhóm này, không quét lại phần chữ
+DELIMITER = re.compile(
+    f'[{re.escape(DELIMITERS)}][{re.escape(CLOSERS)}]*\\s*[{re.escape(OPENERS)}]*'
+)
+WHITESPACE = re.compile(r'\s+')
+
+
+def _quote_parity(text: str) -> int:
+    # split_sentence đếm '"' ba lần: chỉ tính chẵn/lẻ nên 3 lần cũng như 1 lần
+    return sum(map(text.count, QUOTES)) & 1
+
+
+def iter_sentences(blocks: Iterable[Union[str, bytes]], min_length: int = MIN_LENGTH
+                   ) -> Iterator[Tuple[str, int, int]]:
+    """Incremental split_sentence: yield (sentence, start, end) as soon as each sentence is final.
+
+    blocks can be str or UTF-8 bytes (file lines, upload chunks); start/end are character offsets
+    into the concatenated input, and the sentences equal split_sentence(''.join(blocks)). Work is
+    linear in the input and only the unfinished sentence is buffered (which, as in split_sentence,
+    runs on while a quote is open).
+    """
+    decoder = None
+    # buffer: phần chưa quét; head: chữ đã quét (không có dấu câu) của đoạn đang chờ dấu câu
+    buffer = ""
+    buffer_offset = 0
+    head = []
+    segment_start = 0
+    at_start = True
+
+    current = ""
+    current_start = current_end = 0
+    quote_odd = 0
+
+    final = False
+    blocks = iter(blocks)
+    while not final:
+        block = next(blocks, None)
+        if block is None:
+            final = True
+            block = decoder.decode(b"", final=True) if decoder is not None else ""
+        elif isinstance(block, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder("utf-8")()
+            block = decoder.decode(block)
+        buffer += block
+
+        if at_start:
+            # text.strip() của split_sentence: bỏ khoảng trắng đầu văn bản
+            stripped = buffer.lstrip()
+            buffer_offset += len(buffer) - len(stripped)
+            segment_start = buffer_offset
+            buffer = stripped
+            at_start = not buffer
+        if final:
+            buffer_offset = segment_start
+            buffer = ("".join(head) + buffer).rstrip()
+            head = []
+
+        position = 0
+        match = None
+        while True:
+            match = DELIMITER.search(buffer, position)
+            # Nhóm chạm cuối buffer có thể còn ngoặc/khoảng trắng ở block sau
+            if match is None or (not final and match.end() == len(buffer)):
+                break
+            text = "".join(head) + buffer[position:match.start()]
+            raw = text + match.group(0)
+            start = segment_start
+            end = buffer_offset + match.end()
+            head = []
+            position = match.end()
+            segment_start = end
+            # Đoạn chữ rỗng (hai dấu câu liền nhau): split_sentence bỏ qua cả dấu câu đó
+            if not text:
+                continue
+
+            if raw[0].isspace():
+                start += len(raw) - len(raw.lstrip())
+            if raw[-1].isspace():
+                end -= len(raw) - len(raw.rstrip())
+            chunk = WHITESPACE.sub(' ', raw)
+            quote_odd ^= _quote_parity(chunk)
+
+            if quote_odd or len(current) + len(chunk) < min_length:
+                if not current:
+                    current_start = start
+                current += chunk
+                current_end = end
+            else:
+                if current:
+                    yield (current + chunk).strip(), current_start, end
+                    current = ""
+                else:
+                    yield chunk.strip(), start, end
+                quote_odd = 0
+
+        if final:
+            break
+        # Phần đã quét không chứa dấu câu nên không bao giờ phải quét lại
+        scanned = match.start() if match is not None else len(buffer)
+        if scanned > position:
+            head.append(buffer[position:scanned])
+        buffer_offset += scanned
+        buffer = buffer[scanned:]
+
+    # Phần sau dấu câu cuối cùng
+    buffer = buffer[position:]
+    buffer_offset += position
+    tail = WHITESPACE.sub(' ', buffer)
+    tail_end = buffer_offset + len(buffer)
+    if current:
+        sentence = (current + tail).strip()
+        if sentence:
+            yield sentence, current_start, tail_end if tail else current_end
+    elif tail.strip():
+        yield tail.strip(), buffer_offset + len(buffer) - len(buffer.lstrip()), tail_end
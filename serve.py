@@ -0,0 +1,17 @@
+"""Start the Streamlit server only after the segmenter is warm.
+
+Streamlit runs app.py inside this same process, so the jieba dictionary loaded here is the one
+every session uses, and /_stcore/health cannot answer before it is ready.
+
+Usage: python serve.py [streamlit options...]
+"""
+import sys
+
+from streamlit.web import cli as stcli
+
+import segmenter
+
+if __name__ == "__main__":
+    segmenter.warm_up()
+    sys.argv = ["streamlit", "run", "app.py", *sys.argv[1:]]
+    sys.exit(stcli.main())
@@ -2,10 +2,37 @@
 import re
 import os
 import sys
+import asyncio
+import json
+import time
+import unicodedata
+import uuid
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Optional
 import jieba
 import streamlit as st
 # Import Translator class
-from translator import Translator
+from translator import Translator, PROMPT_VERSION, BATCH_MAX_SEGMENTS, BATCH_MAX_CHARS
+from job_store import JobStore, JobBusyError, is_error_result, get_job_store
+from pinyin_index import annotate_chunks, PINYIN_STYLES
+import segmenter
+from metrics import get_metrics
+from preprocess import split_document_spans, annotate_chunks_parallel, segment_document, pinyin_document
+from packing import pack_units, packing_config, paragraph_breaks
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'template.html')
+
+# Number of batches kept in flight by the async pipeline
+DEFAULT_CONCURRENCY = 4
+# Sentence blocks (interactive mode: paragraphs) per page of the result viewer
+PAGE_SIZE = 50
+
+# Dòng tiêu đề chương: 第十二章, 第3回, Chapter 7...
+CHAPTER_HEADING = re.compile(
+    r'^[ \t\u3000]*(第[0-9零〇一二三四五六七八九十百千万两]+[章回节卷部篇]|chapter\s+\d+)([^\n]{0,30})',
+    re.IGNORECASE | re.MULTILINE
+)
 
 def split_sentence(text: str) -> list:
     """Split text into sentences"""
@@ -47,50 +74,203 @@ def split_sentence(text: str) -> list:
 
 def convert_to_pinyin(text: str, style: str = 'tone_marks') -> str:
     try:
-        pinyin_style = pypinyin.TONE3 if style == 'tone_numbers' else pypinyin.TONE
+        pinyin_style = PINYIN_STYLES.get(style, pypinyin.TONE)
         pinyin_list = pypinyin.pinyin(text, style=pinyin_style)
         return ' '.join([item[0] for item in pinyin_list])
     except:
         return ""
 
 
-def process_chunk(chunk: str, index: int, translator_instance, include_english: bool, second_language: str, pinyin_style: str = 'tone_marks') -> tuple:
+async def process_batch_async(chunks: list, start_index: int, translator_instance, include_english: bool, second_language: str, pinyin_style: str = 'tone_marks', pinyins: list = None, max_segments: int = BATCH_MAX_SEGMENTS, max_chars: Optional[int] = BATCH_MAX_CHARS) -> list:
+    """Translate chunks with one batched request per language, both languages concurrently"""
     try:
-        # Pinyin
-        pinyin = convert_to_pinyin(chunk, pinyin_style)
-
-        # Translation
-        translations = []
-        
-        # English
-        if include_english:
-            english = translator_instance.translate_text(chunk, 'en')
-            translations.append(english)
+        if pinyins is None:
+            pinyins = annotate_chunks(chunks, pinyin_style)
 
-        # Second Language
-        second_trans = translator_instance.translate_text(chunk, second_language)
-        translations.append(second_trans)
+        languages = (['en'] if include_english else []) + [second_language]
+        columns = await asyncio.gather(
+            *(translator_instance.translate_batch_async(chunks, lang, max_segments, max_chars) for lang in languages)
+        )
 
-        return (index, chunk, pinyin, *translations)
+        return [
+            (start_index + i, chunk, pinyins[i], *[column[i] for column in columns])
+            for i, chunk in enumerate(chunks)
+        ]
 
     except Exception as e:
-        print(f"Error chunk {index}: {e}")
-        # Trả về lỗi rõ ràng để hiển thị
+        print(f"Error batch {start_index}: {e}")
         error_msg = f"[Sys Error: {str(e)}]"
         count = 2 if include_english else 1
-        return (index, chunk, pinyin, *([error_msg] * count))
+        pinyins = pinyins or [convert_to_pinyin(chunk, pinyin_style) for chunk in chunks]
+        return [
+            (start_index + i, chunk, pinyins[i], *([error_msg] * count))
+            for i, chunk in enumerate(chunks)
+        ]
+
+
+def normalize_chunk(chunk: str) -> str:
+    """Key under which repeated sentences share one translation"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', chunk)).strip()
+
+
+def dedupe_chunks(chunks: list, indices=None) -> tuple:
+    """Distinct chunks (first spelling wins) and, for each of them, every index where it occurs"""
+    positions = {}
+    unique_chunks = []
+    occurrences = []
+    for i in (range(len(chunks)) if indices is None else indices):
+        chunk = chunks[i]
+        key = normalize_chunk(chunk)
+        if key not in positions:
+            positions[key] = len(unique_chunks)
+            unique_chunks.append(chunk)
+            occurrences.append([])
+        occurrences[positions[key]].append(i)
+    return unique_chunks, occurrences
+
+
+async def iter_batches_async(chunks: list, translator_instance, include_english: bool, second_language: str,
+                             pinyin_style: str = 'tone_marks', concurrency: int = DEFAULT_CONCURRENCY,
+                             report: dict = None, indices: list = None, breaks: set = None):
+    """Yield result lists in completion order, keeping at most `concurrency` request units in flight.
+
+    `indices` restricts the run to those chunk positions (e.g. the ones a resumed job still needs).
+    `breaks` holds the chunk positions followed by a paragraph break; request units prefer to end there.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    indices = list(range(len(chunks))) if indices is None else list(indices)
+    breaks = breaks or set()
+    started = time.perf_counter()
+    # Chạy ngoài event loop: loop dùng chung cho mọi phiên, pinyin cả cuốn sách mất vài giây
+    annotated = await asyncio.get_running_loop().run_in_executor(
+        None, annotate_chunks_parallel, [chunks[i] for i in indices], pinyin_style
+    )
+    pinyins = dict(zip(indices, annotated))
+    if report is not None:
+        report.setdefault('timings', {})['pinyin'] = time.perf_counter() - started
+
+    # Câu lặp lại (tiêu đề chương, lời thoại...) chỉ dịch một lần
+    unique_chunks, occurrences = dedupe_chunks(chunks, indices)
+    # Gom các câu liền nhau thành request theo ngân sách token thay vì số câu cố định
+    budget_tokens, max_segments = packing_config()
+    units = pack_units(
+        unique_chunks, {u for u, positions in enumerate(occurrences) if positions[0] in breaks},
+        budget_tokens, max_segments
+    )
+    if report is not None:
+        languages = 2 if include_english else 1
+        undeduped_units = pack_units(
+            [chunks[i] for i in indices], {n for n, i in enumerate(indices) if i in breaks},
+            budget_tokens, max_segments
+        )
+        report['chunks'] = len(chunks)
+        report['unique_chunks'] = len(unique_chunks)
+        # Với mỗi request: các block hiển thị (vị trí câu gốc) nhận bản dịch của nó
+        report['request_units'] = [
+            sorted(i for u in range(start, stop) for i in occurrences[u]) for start, stop in units
+        ]
+        report['api_calls_saved'] = languages * (len(undeduped_units) - len(units))
+
+    async def run(start, stop):
+        async with semaphore:
+            results = await process_batch_async(
+                unique_chunks[start:stop], start,
+                translator_instance, include_english, second_language, pinyin_style,
+                [pinyins[occurrences[u][0]] for u in range(start, stop)],
+                # pack_units đã định cỡ unit theo token: một unit là đúng một request mỗi ngôn ngữ
+                max_segments, max_chars=None
+            )
+        # Gán bản dịch cho mọi vị trí xuất hiện, giữ nguyên số thứ tự câu gốc
+        return [
+            (i, chunks[i], pinyins[i], *translations)
+            for u, _, _, *translations in results
+            for i in occurrences[u]
+        ]
+
+    tasks = [asyncio.create_task(run(start, stop)) for start, stop in units]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def segment_paragraphs(text: str) -> list:
+    """(word, start, end) jieba tokens for each line; empty lines become a '\\n' marker"""
+    segmenter.warm_up()
+    all_words = []
+    offset = 0
+    for paragraph in text.split('\n'):
+        if paragraph.strip():
+            # Use jieba.tokenize to get position information
+            tokens = sorted(jieba.tokenize(paragraph), key=lambda x: x[1])
+            all_words.extend((word, offset + start, offset + end) for word, start, end in tokens)
+        else:
+            all_words.append(('\n', offset, offset))
+        offset += len(paragraph) + 1
+    return all_words
+
+
+def process_interactive_text(text: str, target_lang: str, progress_callback=None,
+                             pinyin_style: str = 'tone_marks') -> list:
+    """Word data for Interactive Word-by-Word mode; every distinct word is resolved once"""
+    translator_instance = Translator()
+    all_words = segment_document(text)
+    pinyin_index = pinyin_document(text, pinyin_style)
+
+    # Chỉ xử lý mỗi từ khác nhau một lần rồi gán lại cho mọi vị trí
+    unique_words = list(dict.fromkeys(
+        word for word, _, _ in all_words
+        if word != '\n' and word.strip() and '\u4e00' <= word <= '\u9fff'
+    ))
+
+    translations = {}
+    step = 500
+    for start in range(0, len(unique_words), step):
+        translations.update(translator_instance.lookup_words(unique_words[start:start + step], target_lang))
+        if progress_callback:
+            progress_callback(min(100, (start + step) / len(unique_words) * 100))
+
+    # Pinyin lấy theo vị trí trong văn bản (đúng ngữ cảnh cho chữ đa âm)
+    word_info = {}
+    processed_words = []
+    for word, start, end in all_words:
+        if word == '\n':
+            processed_words.append({'word': '\n'})
+        elif word in translations:
+            word_pinyin = pinyin_index.slice(start, end)
+            key = (word, word_pinyin)
+            if key not in word_info:
+                translation = translations[word]
+                word_info[key] = {
+                    'word': word,
+                    'pinyin': word_pinyin,
+                    'translations': [translation] if translation else []
+                }
+            processed_words.append(word_info[key])
+        elif word.strip():
+            processed_words.append({'word': word, 'pinyin': '', 'translations': []})
+        else:
+            processed_words.append({'word': '', 'pinyin': '', 'translations': []})
+
+    if progress_callback:
+        progress_callback(100)
+    return processed_words
+
+
+# Nút đọc câu cần speakSentence của template.html, chỉ dùng được trong trang kết quả đầy đủ
+SPEAK_BUTTON = '''<button class="speak-button" onclick="speakSentence(this.parentElement.textContent.replace('🔊', ''))"><svg viewBox="0 0 24 24"><path d="M3 9v6h4l5 5V4L7 9H3zm13.5 3c0-1.77-1.02-3.29-2.5-4.03v8.05c1.48-.73 2.5-2.25 2.5-4.02zM14 3.23v2.06c2.89.86 5 3.54 5 6.71s-2.11 5.85-5 6.71v2.06c4.01-.91 7-4.49 7-8.77s-2.99-7.86-7-8.77z"/></svg></button>'''
 
 
 def create_html_block(results: tuple, include_english: bool) -> str:
-    speak_button = '''<button class="speak-button" onclick="speakSentence(this.parentElement.textContent.replace('🔊', ''))"><svg viewBox="0 0 24 24"><path d="M3 9v6h4l5 5V4L7 9H3zm13.5 3c0-1.77-1.02-3.29-2.5-4.03v8.05c1.48-.73 2.5-2.25 2.5-4.02zM14 3.23v2.06c2.89.86 5 3.54 5 6.71s-2.11 5.85-5 6.71v2.06c4.01-.91 7-4.49 7-8.77s-2.99-7.86-7-8.77z"/></svg></button>'''
-    
     # Safe Unpacking
     try:
         if include_english:
             index, chunk, pinyin, english, second = results
             return f'''
                 <div class="sentence-part responsive">
-                    <div class="original">{index + 1}. {chunk}{speak_button}</div>
+                    <div class="original">{index + 1}. {chunk}{SPEAK_BUTTON}</div>
                     <div class="pinyin">{pinyin}</div>
                     <div class="english">{english}</div>
                     <div class="second-language">{second}</div>
@@ -100,7 +280,7 @@ def create_html_block(results: tuple, include_english: bool) -> str:
             index, chunk, pinyin, second = results
             return f'''
                 <div class="sentence-part responsive">
-                    <div class="original">{index + 1}. {chunk}{speak_button}</div>
+                    <div class="original">{index + 1}. {chunk}{SPEAK_BUTTON}</div>
                     <div class="pinyin">{pinyin}</div>
                     <div class="second-language">{second}</div>
                 </div>
@@ -109,76 +289,289 @@ def create_html_block(results: tuple, include_english: bool) -> str:
         return f"<div>Error displaying block {results[1]}</div>"
 
 
+def interactive_payload(word_data: list) -> dict:
+    """Word table plus token ids for the interactive view (-1 marks a line break).
+
+    Each distinct (word, pinyin, translation) is stored once as [word, pinyin, translation];
+    text without a translation is stored as [text].
+    """
+    ids = {}
+    words = []
+    tokens = []
+    for word in word_data:
+        text = word.get('word', '')
+        if text == '\n':
+            tokens.append(-1)
+            continue
+        if not text:
+            continue
+        translations = word.get('translations')
+        entry = (text, word['pinyin'], translations[-1]) if translations else (text,)
+        token_id = ids.get(entry)
+        if token_id is None:
+            token_id = ids[entry] = len(words)
+            words.append(entry)
+        tokens.append(token_id)
+    return {'words': words, 'tokens': tokens}
+
+
 def create_interactive_html_block(results: tuple, include_english: bool) -> str:
-    chunk, word_data = results
-    content_html = '<div class="interactive-text">'
-    
-    current_paragraph = []
-    paragraphs = []
-    
+    """Container plus embedded JSON; template.html builds the paragraphs and tooltips client-side"""
+    _, word_data = results
+    # "</" trong JSON sẽ đóng thẻ <script> sớm
+    payload = json.dumps(interactive_payload(word_data), ensure_ascii=False, separators=(',', ':'))
+    payload = payload.replace('</', '<\\/')
+    return (
+        '<div class="interactive-text"></div>'
+        f'<script type="application/json" class="interactive-data">{payload}</script>'
+    )
+
+
+@lru_cache(maxsize=None)
+def get_template_parts() -> tuple:
+    """template.html split around {{content}}; read once per process and shared by all sessions"""
+    with open(TEMPLATE_PATH, 'r', encoding='utf-8') as f: html = f.read()
+    prefix, _, suffix = html.partition('{{content}}')
+    return prefix, suffix
+
+
+def render_document(blocks) -> str:
+    """Full HTML page for rendered blocks, assembled with a single join"""
+    prefix, suffix = get_template_parts()
+    return "".join([prefix, *blocks, suffix])
+
+
+def write_document(blocks, stream) -> None:
+    """Write the page straight to a text stream without building it in memory"""
+    prefix, suffix = get_template_parts()
+    stream.write(prefix)
+    for block in blocks:
+        stream.write(block)
+    stream.write(suffix)
+
+
+def chapter_starts(text: str, spans: list) -> list:
+    """(sentence index, heading) for every chapter heading line of text, given split_document_spans(text)"""
+    starts = [start for _, start, _ in spans]
+    chapters = {}
+    for match in CHAPTER_HEADING.finditer(text):
+        # Câu chứa dòng tiêu đề (tiêu đề ngắn thường bị gộp với câu sau)
+        index = max(0, bisect_right(starts, match.start(1)) - 1)
+        chapters.setdefault(index, (match.group(1) + match.group(2)).strip())
+    return sorted(chapters.items())
+
+
+def paginate(total: int, chapters: list = (), page_size: int = PAGE_SIZE) -> list:
+    """(start, stop, title) pages: a new page at every chapter and at least every page_size items"""
+    titles = dict(chapters)
+    bounds = sorted(index for index in titles if 0 < index < total) + [total]
+    pages = []
+    start = 0
+    for end in bounds:
+        while start < end:
+            stop = min(end, start + page_size)
+            pages.append((start, stop, titles.get(start, "")))
+            start = stop
+    return pages
+
+
+def interactive_pages(word_data: list, include_english: bool, page_size: int = PAGE_SIZE) -> list:
+    """create_interactive_html_block per page of paragraphs, breaking at chapter headings"""
+    paragraphs = [[]]
     for word in word_data:
-        if isinstance(word, dict) and word.get('word') == '\n':
-            if current_paragraph:
-                paragraphs.append(current_paragraph)
-                current_paragraph = []
+        if word.get('word') == '\n':
+            if paragraphs[-1]:
+                paragraphs.append([])
         else:
-            current_paragraph.append(word)
-    if current_paragraph: paragraphs.append(current_paragraph)
-    
-    for paragraph in paragraphs:
-        content_html += '<p class="interactive-paragraph">'
-        for word_data in paragraph:
-            if word_data.get('translations'):
-                tooltip = f"{word_data['pinyin']}\n{word_data['translations'][-1]}"
-                content_html += f'<span class="interactive-word" onclick="speak(\'{word_data["word"]}\')" data-tooltip="{tooltip}">{word_data["word"]}</span>'
-            else:
-                content_html += f'<span class="non-chinese">{word_data.get("word", "")}</span>'
-        content_html += '</p>'
-    
-    return content_html + '</div>'
+            paragraphs[-1].append(word)
+    if not paragraphs[-1]:
+        paragraphs.pop()
+
+    chapters = []
+    for i, paragraph in enumerate(paragraphs):
+        match = CHAPTER_HEADING.match("".join(word.get('word', '') for word in paragraph[:20]))
+        if match:
+            chapters.append((i, match.group(1)))
+
+    blocks = []
+    for start, stop, title in paginate(len(paragraphs), chapters, page_size):
+        words = []
+        for paragraph in paragraphs[start:stop]:
+            words.extend(paragraph)
+            words.append({'word': '\n'})
+        blocks.append((create_interactive_html_block((None, words), include_english), title))
+    return blocks
+
+
+def job_params(include_english=True, second_language="vi", pinyin_style='tone_marks') -> dict:
+    """Settings that identify a checkpointed job (together with the input text)"""
+    return {
+        'include_english': include_english,
+        'second_language': second_language,
+        'pinyin_style': pinyin_style,
+        'prompt_version': PROMPT_VERSION,
+    }
+
+
+def record_stage_timings(timings: dict) -> None:
+    metrics = get_metrics()
+    for stage, seconds in timings.items():
+        metrics.observe(f"stage_{stage}_seconds", seconds)
+
+
+def load_checkpoint(job_store, job_id: str, chunks: list) -> dict:
+    """Finished results of job_id that still match chunks, by chunk index"""
+    # Chỉ dùng lại kết quả khớp đúng câu hiện tại (cách tách câu có thể đã đổi)
+    return {
+        i: result for i, result in job_store.load_results(job_id).items()
+        if i < len(chunks) and result[1] == chunks[i]
+    }
+
+
+def find_job(input_text: str, include_english=True, second_language="vi", pinyin_style='tone_marks',
+             job_store=None) -> Optional[dict]:
+    """The stored job for this text and settings, or None"""
+    if job_store is None:
+        return None
+    return job_store.get_job(
+        JobStore.make_job_id(input_text.strip(), job_params(include_english, second_language, pinyin_style))
+    )
+
+
+def pending_text(input_text: str, include_english=True, second_language="vi", pinyin_style='tone_marks',
+                 job_store=None) -> str:
+    """The part of input_text a Standard run would still send to the API (all of it without a checkpoint)"""
+    text = input_text.strip()
+    job = find_job(text, include_english, second_language, pinyin_style, job_store)
+    if job is None:
+        return text
+    chunks = [chunk for chunk, _, _ in split_document_spans(text)]
+    completed = load_checkpoint(job_store, job['job_id'], chunks)
+    return "\n".join(chunk for i, chunk in enumerate(chunks) if i not in completed)
+
+
+def iter_translate_file(input_text: str, progress_callback=None, include_english=True,
+                        second_language="vi", pinyin_style='tone_marks',
+                        concurrency=DEFAULT_CONCURRENCY, report: dict = None, job_store=None,
+                        worker: str = None):
+    """Yield rendered sentence blocks in document order as soon as each one is ready.
+
+    With a job_store, finished chunks are checkpointed and a rerun of the same text and settings
+    only translates chunks that are missing or ended in an error. The run holds the job's lease
+    (as worker, or a one-off id) and raises JobBusyError if another live worker is running it.
+    """
+    args = (input_text, progress_callback, include_english, second_language, pinyin_style, concurrency, report,
+            job_store)
+    if job_store is None:
+        yield from _translate_blocks(*args)
+        return
+
+    worker = worker or f"foreground-{uuid.uuid4().hex}"
+    params = job_params(include_english, second_language, pinyin_style)
+    job_id = JobStore.make_job_id(input_text.strip(), params)
+    job_store.create_job(job_id, params, 0)
+    if not job_store.claim_job(job_id, worker):
+        raise JobBusyError("this text is already being translated")
+    try:
+        yield from _translate_blocks(*args)
+    finally:
+        job_store.release_job(job_id, worker)
+
+
+def _translate_blocks(input_text: str, progress_callback, include_english, second_language, pinyin_style,
+                      concurrency, report, job_store):
+    translator_instance = Translator()
+    report = {} if report is None else report
+    timings = report['timings'] = {'split': 0.0, 'pinyin': 0.0, 'translate': 0.0, 'render': 0.0}
+
+    started = time.perf_counter()
+    text = input_text.strip()
+    spans = split_document_spans(text)
+    chunks = [chunk for chunk, _, _ in spans]
+    breaks = paragraph_breaks(text, spans)
+    report['chapters'] = chapter_starts(text, spans)
+    total = len(chunks)
+    timings['split'] = time.perf_counter() - started
+
+    if progress_callback: progress_callback(0)
+
+    completed = {}
+    job_id = None
+    if job_store is not None:
+        params = job_params(include_english, second_language, pinyin_style)
+        job_id = JobStore.make_job_id(text, params)
+        job_store.create_job(job_id, params, total)
+        completed = load_checkpoint(job_store, job_id, chunks)
+    pending = [i for i in range(total) if i not in completed]
+
+    report['job_id'] = job_id
+    report['resumed_chunks'] = len(completed)
+
+    # Lô xong trước được giữ lại cho tới khi các câu phía trước đã hiển thị
+    started = time.perf_counter()
+    ready = {i: create_html_block(result, include_english) for i, result in completed.items()}
+    timings['render'] += time.perf_counter() - started
+    next_index = 0
+    done = len(completed)
+    failed = 0
+
+    while next_index in ready:
+        yield ready.pop(next_index)
+        next_index += 1
+
+    # Chỉ tính thời gian chờ lô dịch, không tính lúc người gọi đang xử lý các block đã yield
+    waiting_since = time.perf_counter()
+    for results in translator_instance.iterate(iter_batches_async(
+        chunks, translator_instance, include_english, second_language, pinyin_style, concurrency, report, pending,
+        breaks
+    )):
+        timings['translate'] += time.perf_counter() - waiting_since
+        if job_store is not None:
+            job_store.save_results(job_id, results)
+        failed += sum(1 for result in results if is_error_result(result))
+        started = time.perf_counter()
+        for result in results:
+            ready[result[0]] = create_html_block(result, include_english)
+        timings['render'] += time.perf_counter() - started
+        done += len(results)
+
+        if progress_callback:
+            progress_callback(min(100, (done/total)*100))
+
+        while next_index in ready:
+            yield ready.pop(next_index)
+            next_index += 1
+        waiting_since = time.perf_counter()
+
+    # Thời gian pinyin nằm trong lần chờ lô đầu tiên
+    timings['translate'] = max(0.0, timings['translate'] - timings['pinyin'])
+    if job_store is not None:
+        job_store.set_status(job_id, 'completed_with_errors' if failed else 'completed')
+    report['failed_chunks'] = failed
+    record_stage_timings(timings)
 
 
 def translate_file(input_text: str, progress_callback=None, include_english=True, 
                   second_language="vi", pinyin_style='tone_marks', 
-                  translation_mode="Standard Translation", processed_words=None):
+                  translation_mode="Standard Translation", processed_words=None,
+                  concurrency=DEFAULT_CONCURRENCY, report: dict = None, job_store=None):
     try:
         text = input_text.strip()
-        
-        # --- QUAN TRỌNG: Khởi tạo Translator mới 100% ở đây ---
-        # Bỏ qua session_state để tránh cache lỗi cũ
-        translator_instance = Translator()
-        # ----------------------------------------------------
 
         if translation_mode == "Interactive Word-by-Word" and processed_words:
-            with open('template.html', 'r', encoding='utf-8') as f: html = f.read()
             content = create_interactive_html_block((text, processed_words), include_english)
-            return html.replace('{{content}}', content)
+            return render_document([content])
         
         else:
-            chunks = split_sentence(text)
-            total = len(chunks)
-            translation_content = ""
-            
-            if progress_callback: progress_callback(0)
-
-            # Chạy tuần tự để đảm bảo ổn định (Sequential processing)
-            for i, chunk in enumerate(chunks):
-                result = process_chunk(
-                    chunk, i, 
-                    translator_instance, 
-                    include_english, second_language, pinyin_style
-                )
-                translation_content += create_html_block(result, include_english)
-                
-                if progress_callback:
-                    progress_callback(min(100, ((i+1)/total)*100))
-
-            with open('template.html', 'r', encoding='utf-8') as f: html = f.read()
-            return html.replace('{{content}}', translation_content)
+            return render_document(iter_translate_file(
+                text, progress_callback, include_english, second_language, pinyin_style, concurrency, report,
+                job_store
+            ))
 
     except Exception as e:
         return f"<h3>Critical Error: {str(e)}</h3>"
 
+
 if __name__ == "__main__":
     if len(sys.argv) > 1 and os.path.exists(sys.argv[1]):
-        print(translate_file(open(sys.argv[1], 'r', encoding='utf-8').read()))
+        write_document(iter_translate_file(open(sys.argv[1], 'r', encoding='utf-8').read(), job_store=get_job_store()), sys.stdout)
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class TranslationCache:
+    """Persistent translation cache shared by every thread and process on the host"""
+
+    # Chỉ dọn cache sau mỗi N lần ghi để không phải COUNT(*) liên tục
+    EVICT_EVERY = 500
+
+    def __init__(self, path: str = ".cache/translations.db", max_entries: int = 200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " key TEXT PRIMARY KEY,"
+            " translation TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON translations(last_used)")
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite handles locking between processes"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(text: str, target_lang: str, model_name: str, prompt_version: str) -> str:
+        """Hash every input that changes the translation"""
+        raw = "\x1f".join([text, target_lang, model_name, prompt_version])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT translation FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE translations SET last_used = ? WHERE key = ?", (time.time(), key)
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Cache read error: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def set(self, key: str, translation: str) -> None:
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO translations (key, translation, last_used) VALUES (?, ?, ?)",
+                (key, translation, time.time())
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Cache write error: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            should_evict = self._writes % self.EVICT_EVERY == 0
+        if should_evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop least recently used entries above max_entries"""
+        try:
+            conn = self._connect()
+            count = conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return 0
+            conn.execute(
+                "DELETE FROM translations WHERE key IN ("
+                " SELECT key FROM translations ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+            conn.commit()
+            return excess
+        except sqlite3.Error as e:
+            print(f"Cache eviction error: {e}")
+            return 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / total if total else 0.0,
+        }
@@ -1,11 +1,14 @@
-import streamlit as st
-import jieba
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-from pypinyin import pinyin, Style
+import json
+import asyncio
+import threading
 import time
-import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from translation_cache import TranslationCache
+from rate_limiter import AdaptiveRateLimiter
+from hedging import Hedger
+from dictionary import get_dictionary
+from metrics import get_metrics
+from config import config_section
 
 # Map tên ngôn ngữ đầy đủ để Gemini hiểu rõ hơn
 CODE_TO_LANG_NAME = {
@@ -15,6 +18,49 @@
     "zh-Hans": "Chinese (Simplified)"
 }
 
+# Giới hạn mỗi request dịch theo lô
+BATCH_MAX_SEGMENTS = 25
+BATCH_MAX_CHARS = 4000
+# Từ đơn lẻ rất ngắn nên gửi được nhiều hơn mỗi request
+WORDS_PER_REQUEST = 100
+
+# Số lần thử lại khi gặp lỗi 429
+MAX_RETRIES = 5
+
+# Tăng số này mỗi khi sửa prompt để không dùng lại bản dịch cũ trong cache
+PROMPT_VERSION = "1"
+
+
+class TranslationError(Exception):
+    """Raised by Translator._generate; str(e) is the message shown in place of a translation"""
+
+
+def _parse_batch_response(raw: str, count: int) -> List[Any]:
+    """Map a JSON batch answer back to segment positions (None when missing or malformed)"""
+    aligned = [None] * count
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return aligned
+
+    if isinstance(data, dict):
+        data = data.get("translations", [])
+    if not isinstance(data, list):
+        return aligned
+
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        try:
+            n = int(item.get("id"))
+        except (TypeError, ValueError):
+            continue
+        translation = item.get("translation")
+        if 1 <= n <= count and isinstance(translation, str) and translation.strip():
+            aligned[n - 1] = translation.strip()
+    return aligned
+
+
 class Translator:
     _instance = None
 
@@ -28,20 +74,28 @@ def __init__(self):
         if not self.initialized:
             self.translated_words: Dict[str, str] = {}
             self.is_ready = False
+            self.model_name = ""
+            self.cache = None
+            self.metrics = get_metrics()
+            self._loop = None
+            self._loop_lock = threading.Lock()
             self._init_config()
+            self._init_cache()
+            self._init_rate_limiter()
+            self._init_hedger()
             self.initialized = True
 
     def _init_config(self):
         try:
             # 1. Lấy API Key từ secrets (ưu tiên [gemini], fallback [deepseek])
-            secrets = st.secrets.get("gemini", {})
-            api_key = secrets.get("api_key") or st.secrets.get("deepseek", {}).get("api_key", "")
+            api_key = config_section("gemini").get("api_key") or config_section("deepseek").get("api_key", "")
             
             if not api_key:
                 print("Error: API Key not found in secrets.toml")
                 return
 
-            # 2. Cấu hình Gemini
+            # 2. Cấu hình Gemini (import muộn: SDK nặng, chỉ cần khi có API key)
+            import google.generativeai as genai
             genai.configure(api_key=api_key)
 
             # 3. Cấu hình Safety Settings (Tắt bộ lọc để dịch không bị chặn)
@@ -66,96 +120,322 @@ def _init_config(self):
             print(f"Gemini Config Error: {str(e)}")
             self.is_ready = False
 
-    def translate_text(self, text: str, target_lang: str) -> str:
-        """Translate text using Google Gemini API with Retry Logic"""
-        if not text or not text.strip():
-            return ""
+    def _init_cache(self):
+        cache_config = config_section("cache")
 
-        # Lấy tên đầy đủ của ngôn ngữ (VD: vi -> Vietnamese)
-        full_lang_name = CODE_TO_LANG_NAME.get(target_lang, target_lang)
+        if not cache_config.get("enabled", True):
+            return
+
+        try:
+            self.cache = TranslationCache(
+                path=cache_config.get("path", ".cache/translations.db"),
+                max_entries=cache_config.get("max_entries", 200000)
+            )
+        except Exception as e:
+            print(f"Translation Cache Error: {str(e)}")
+            self.cache = None
+
+    def _init_rate_limiter(self):
+        limit_config = config_section("rate_limit")
+        try:
+            self.rate_limiter = AdaptiveRateLimiter(**limit_config)
+        except Exception as e:
+            # Sai tên/giá trị trong [rate_limit] không được làm hỏng mọi trang
+            print(f"Rate Limit Config Error: {str(e)}; using defaults")
+            self.rate_limiter = AdaptiveRateLimiter()
+
+    def _init_hedger(self):
+        """Hedged requests are opt-in: [hedging] enabled = true"""
+        hedge_config = config_section("hedging")
+        self.hedger = None
+        if hedge_config.pop("enabled", False):
+            try:
+                self.hedger = Hedger(**hedge_config)
+            except Exception as e:
+                print(f"Hedging Config Error: {str(e)}; using defaults")
+                self.hedger = Hedger()
+
+    def _cache_get(self, text: str, full_lang_name: str):
+        """Look up a translation in memory, then on disk"""
         cache_key = f"{text}_{full_lang_name}"
-        
-        # Check cache first
         if cache_key in self.translated_words:
+            self.metrics.inc('cache_hits_memory')
             return self.translated_words[cache_key]
 
-        if not self.is_ready:
-            return "[Error: Config Invalid]"
-        
+        if self.cache is not None:
+            disk_key = TranslationCache.make_key(text, full_lang_name, self.model_name, PROMPT_VERSION)
+            cached = self.cache.get(disk_key)
+            if cached is not None:
+                self.metrics.inc('cache_hits_disk')
+                self.translated_words[cache_key] = cached
+                return cached
+        self.metrics.inc('cache_misses')
+        return None
+
+    def _cache_set(self, text: str, full_lang_name: str, translation: str):
+        self.translated_words[f"{text}_{full_lang_name}"] = translation
+        if self.cache is not None:
+            disk_key = TranslationCache.make_key(text, full_lang_name, self.model_name, PROMPT_VERSION)
+            self.cache.set(disk_key, translation)
+
+    @staticmethod
+    def _error_message(error_msg: str) -> str:
+        """Displayable message for a non-retryable Gemini error"""
+        print(f"Translation Error: {error_msg}")
+        if "404" in error_msg: return "[Error: Model not found]"
+        if "400" in error_msg: return "[Error: Invalid API Key]"
+        return f"[Error: {error_msg}]"
+
+    def _record_response(self, prompt: str, response, started: float) -> str:
+        """Count a successful call and return its text"""
+        text = response.text.strip() if response.text else ""
+        self.metrics.observe('request_seconds', time.perf_counter() - started)
+        self.metrics.inc('requests')
+        self.metrics.inc('chars_in', len(prompt))
+        self.metrics.inc('chars_out', len(text))
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self.metrics.inc('tokens_in', getattr(usage, "prompt_token_count", 0) or 0)
+            self.metrics.inc('tokens_out', getattr(usage, "candidates_token_count", 0) or 0)
+        return text
+
+    def _record_rate_limited(self, attempt: int):
+        self.rate_limiter.on_rate_limited()
+        self.metrics.inc('rate_limited')
+        if attempt < MAX_RETRIES - 1:
+            self.metrics.inc('retries')
+
+    def _generate(self, prompt: str, generation_config=None) -> str:
+        """Call Gemini with retry on 429; raises TranslationError with a displayable message"""
         # --- CƠ CHẾ RETRY (Xử lý lỗi 429 Rate Limit) ---
-        max_retries = 5
-        base_delay = 2 
+        # Bộ giới hạn dùng chung quyết định thời gian chờ, không sleep riêng từng request
+        for attempt in range(MAX_RETRIES):
+            self.rate_limiter.acquire()
+            started = time.perf_counter()
+            try:
+                with self.metrics.in_flight():
+                    response = self.model.generate_content(prompt, generation_config=generation_config)
+                self.rate_limiter.on_success()
+                return self._record_response(prompt, response, started)
 
-        prompt = (
-            f"Translate the following Chinese text into {full_lang_name}. "
-            "Output ONLY the translation. No explanations, no pinyin.\n\n"
-            f"Text: {text}"
-        )
+            except Exception as e:
+                error_msg = str(e)
+                if "429" in error_msg:
+                    self._record_rate_limited(attempt)
+                    if attempt < MAX_RETRIES - 1:
+                        continue
+                    raise TranslationError("[Error: Rate limit exceeded]")
+                self.metrics.inc('errors')
+                raise TranslationError(self._error_message(error_msg))
+        
+        raise TranslationError("[Error: Request Failed]")
 
-        for attempt in range(max_retries):
+    async def _call_model_async(self, prompt: str, generation_config=None):
+        """One Gemini call, raced against a duplicate when it is slow and hedging is enabled"""
+        def make_call():
+            return self.model.generate_content_async(prompt, generation_config=generation_config)
+
+        if self.hedger is None:
+            return await make_call()
+        return await self.hedger.call(make_call, self.rate_limiter.acquire_async, self.metrics)
+
+    async def _generate_async(self, prompt: str, generation_config=None) -> str:
+        """Async counterpart of _generate; runs on the translator event loop"""
+        for attempt in range(MAX_RETRIES):
+            await self.rate_limiter.acquire_async()
+            started = time.perf_counter()
             try:
-                response = self.model.generate_content(prompt)
-                
-                if response.text:
-                    translation = response.text.strip()
-                    self.translated_words[cache_key] = translation
-                    return translation
-                return ""
+                with self.metrics.in_flight():
+                    response = await self._call_model_async(prompt, generation_config)
+                self.rate_limiter.on_success()
+                return self._record_response(prompt, response, started)
 
             except Exception as e:
                 error_msg = str(e)
-                # Nếu bị quá tải (429), chờ và thử lại
                 if "429" in error_msg:
-                    if attempt < max_retries - 1:
-                        wait_time = base_delay * (2 ** attempt) + random.uniform(0, 1)
-                        print(f"Rate limit (429). Retrying in {wait_time:.2f}s...")
-                        time.sleep(wait_time)
+                    self._record_rate_limited(attempt)
+                    if attempt < MAX_RETRIES - 1:
                         continue
-                    else:
-                        return "[Error: Rate limit exceeded]"
-                
-                # Các lỗi khác
-                print(f"Translation Error: {error_msg}")
-                if "404" in error_msg: return "[Error: Model not found]"
-                if "400" in error_msg: return "[Error: Invalid API Key]"
-                return f"[Error: {error_msg}]"
+                    raise TranslationError("[Error: Rate limit exceeded]")
+                self.metrics.inc('errors')
+                raise TranslationError(self._error_message(error_msg))
+
+        raise TranslationError("[Error: Request Failed]")
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Process-wide event loop in a daemon thread; Gemini's async client binds to one loop"""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="translator-loop", daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    def run(self, coro):
+        """Run a coroutine on the translator loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result()
+
+    def iterate(self, agen):
+        """Drive an async generator from synchronous code, so callbacks stay on the caller's thread"""
+        async def next_item():
+            return await agen.__anext__()
+
+        try:
+            while True:
+                try:
+                    yield self.run(next_item())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
+
+    @staticmethod
+    def _text_prompt(text: str, full_lang_name: str) -> str:
+        return (
+            f"Translate the following Chinese text into {full_lang_name}. "
+            "Output ONLY the translation. No explanations, no pinyin.\n\n"
+            f"Text: {text}"
+        )
+
+    @staticmethod
+    def _batch_prompt(segments: List[str], full_lang_name: str) -> str:
+        payload = json.dumps(
+            [{"id": n, "text": text} for n, text in enumerate(segments, 1)],
+            ensure_ascii=False
+        )
+        return (
+            f"Translate each of the following numbered Chinese segments into {full_lang_name}. "
+            'Return a JSON array of objects with keys "id" (the segment number) and "translation". '
+            "Translate every segment separately, keep the same ids, do not merge or split segments. "
+            "No explanations, no pinyin.\n\n"
+            f"Segments: {payload}"
+        )
+
+    def translate_text(self, text: str, target_lang: str) -> str:
+        """Translate text using Google Gemini API with Retry Logic"""
+        if not text or not text.strip():
+            return ""
+
+        # Lấy tên đầy đủ của ngôn ngữ (VD: vi -> Vietnamese)
+        full_lang_name = CODE_TO_LANG_NAME.get(target_lang, target_lang)
         
-        return "[Error: Request Failed]"
+        # Check cache first (memory, then disk)
+        cached = self._cache_get(text, full_lang_name)
+        if cached is not None:
+            return cached
+
+        if not self.is_ready:
+            return "[Error: Config Invalid]"
 
-    def process_chinese_text(self, text, target_lang="en"):
-        """Process Chinese text for word-by-word translation"""
         try:
-            # Segment the text using jieba
-            words = list(jieba.cut(text))
-            processed_words = []
-            
-            for i, word in enumerate(words):
-                is_meaningful = '\u4e00' <= word <= '\u9fff'
-                word_pinyin = ""
-                translation = ""
+            translation = self._generate(self._text_prompt(text, full_lang_name))
+        except TranslationError as e:
+            return str(e)
 
-                # 1. Get Pinyin
-                try:
-                    if word.strip():
-                        char_pinyins = [pinyin(char, style=Style.TONE)[0][0] for char in word]
-                        word_pinyin = ' '.join(char_pinyins)
-                except Exception:
-                    pass
-
-                # 2. Get Translation
-                if is_meaningful:
-                    # Thêm delay nhỏ để tránh spam API khi chạy vòng lặp
-                    time.sleep(0.2)
-                    translation = self.translate_text(word, target_lang)
-
-                processed_words.append({
-                    'word': word,
-                    'pinyin': word_pinyin if is_meaningful else "",
-                    'translations': [translation] if translation else []
-                })
-            
-            return processed_words
-            
-        except Exception as e:
-            print(f"Error processing text: {str(e)}")
-            return []
+        if translation:
+            self._cache_set(text, full_lang_name, translation)
+        return translation
+
+    async def translate_text_async(self, text: str, target_lang: str) -> str:
+        """Async variant of translate_text"""
+        if not text or not text.strip():
+            return ""
+
+        full_lang_name = CODE_TO_LANG_NAME.get(target_lang, target_lang)
+        cached = self._cache_get(text, full_lang_name)
+        if cached is not None:
+            return cached
+
+        if not self.is_ready:
+            return "[Error: Config Invalid]"
+
+        try:
+            translation = await self._generate_async(self._text_prompt(text, full_lang_name))
+        except TranslationError as e:
+            return str(e)
+
+        if translation:
+            self._cache_set(text, full_lang_name, translation)
+        return translation
+
+    def _plan_batch(self, texts: List[str], full_lang_name: str, max_segments: int = BATCH_MAX_SEGMENTS,
+                    max_chars: Optional[int] = BATCH_MAX_CHARS):
+        """Fill cached results and group the remaining segments into request-sized lists (max_chars=None: no cap)"""
+        results = [""] * len(texts)
+        pending = []
+
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            cached = self._cache_get(text, full_lang_name)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+
+        if pending and not self.is_ready:
+            for i in pending:
+                results[i] = "[Error: Config Invalid]"
+            return results, []
+
+        # Chia thành các request vừa phải để model không bỏ sót đoạn
+        groups, group, group_chars = [], [], 0
+        for i in pending:
+            too_long = max_chars is not None and group_chars + len(texts[i]) > max_chars
+            if group and (len(group) >= max_segments or too_long):
+                groups.append(group)
+                group, group_chars = [], 0
+            group.append(i)
+            group_chars += len(texts[i])
+        if group:
+            groups.append(group)
+
+        return results, groups
+
+    async def translate_batch_async(self, texts: List[str], target_lang: str,
+                                    max_segments: int = BATCH_MAX_SEGMENTS,
+                                    max_chars: Optional[int] = BATCH_MAX_CHARS) -> List[str]:
+        """Translate many segments with one request per batch, aligned by segment number; request groups run concurrently"""
+        full_lang_name = CODE_TO_LANG_NAME.get(target_lang, target_lang)
+        results, groups = self._plan_batch(texts, full_lang_name, max_segments, max_chars)
+
+        async def run_group(group):
+            segments = [texts[i] for i in group]
+            try:
+                raw = await self._generate_async(
+                    self._batch_prompt(segments, full_lang_name),
+                    generation_config={"response_mime_type": "application/json"}
+                )
+            except TranslationError as e:
+                for i in group:
+                    results[i] = str(e)
+                return
+
+            for i, translation in zip(group, _parse_batch_response(raw, len(group))):
+                if translation is None:
+                    results[i] = await self.translate_text_async(texts[i], target_lang)
+                else:
+                    results[i] = translation
+                    self._cache_set(texts[i], full_lang_name, translation)
+
+        await asyncio.gather(*(run_group(group) for group in groups))
+        return results
+
+    def lookup_words(self, words: List[str], target_lang: str) -> Dict[str, str]:
+        """Translate a set of words: dictionary hits first, the rest in a few batched requests"""
+        unique_words = list(dict.fromkeys(words))
+        translations = {}
+        dictionary = get_dictionary(target_lang)
+
+        missing = []
+        for word in unique_words:
+            gloss = dictionary.lookup(word) if dictionary is not None else None
+            if gloss:
+                translations[word] = gloss
+            else:
+                missing.append(word)
+
+        if missing:
+            results = self.run(self.translate_batch_async(missing, target_lang, max_segments=WORDS_PER_REQUEST))
+            translations.update(zip(missing, results))
+        return translations
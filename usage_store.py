@@ -0,0 +1,605 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Tuple
+
+from config import config_section
+
+_store = None
+_store_lock = threading.Lock()
+
+Key = Tuple[str, str]
+
+
+def week_of(day: str) -> str:
+    """ISO week label ("2024-W07") of a YYYY-MM-DD day"""
+    year, week, _ = date.fromisoformat(day).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def rollup_deltas(amounts: Dict[Key, int], tiers: Dict[str, str]) -> dict:
+    """What one flushed batch adds to each rollup: per day, per week, per (tier, day) and per user"""
+    days, weeks, tier_days = defaultdict(int), defaultdict(int), defaultdict(int)
+    users = {}
+    for (user, day), amount in amounts.items():
+        tier = tiers.get(user, "default")
+        days[day] += amount
+        weeks[week_of(day)] += amount
+        tier_days[(tier, day)] += amount
+        _, total, last_day = users.get(user, (tier, 0, ""))
+        users[user] = (tier, total + amount, max(last_day, day))
+    return {'days': days, 'weeks': weeks, 'tier_days': tier_days, 'users': users}
+
+
+class UsageStore(ABC):
+    """Per-user daily character counters shared by every session, with buffered writes.
+
+    increment() only adds to an in-process buffer that a background thread flushes to the
+    backend as atomic increments, and get() answers from a local copy of the backend value
+    (refreshed every ttl seconds) plus this process's unflushed amounts. Quota checks never
+    wait on the backend except for the first read of a key; other replicas see new usage
+    within flush_interval + ttl.
+
+    Each flush also updates the dashboard rollups (daily, weekly, per-tier and per-user totals)
+    and bumps data_version, so the admin view never has to scan the raw counters.
+
+    Subclasses implement the backend hooks.
+    """
+
+    # Bỏ khỏi bộ nhớ những key không được đọc trong khoảng này
+    IDLE_SECONDS = 600
+
+    def __init__(self, flush_interval: float = 2.0, ttl: float = 5.0):
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._base: Dict[Key, int] = {}
+        self._fetched: Dict[Key, float] = {}
+        self._accessed: Dict[Key, float] = {}
+        self._pending: Dict[Key, int] = defaultdict(int)
+        self._inflight: Dict[Key, int] = {}
+        self._tiers: Dict[str, str] = {}
+        self._flusher = None
+        atexit.register(self.flush)
+
+    # Backend hooks
+    @abstractmethod
+    def _increment_many(self, amounts: Dict[Key, int], rollups: dict) -> None:
+        pass
+
+    @abstractmethod
+    def _fetch_many(self, keys: list) -> Dict[Key, int]:
+        pass
+
+    @abstractmethod
+    def _read_version(self) -> int:
+        pass
+
+    @abstractmethod
+    def summary(self) -> dict:
+        """{'users': number of users, 'chars': characters over all time}"""
+
+    @abstractmethod
+    def daily_totals(self) -> Dict[str, int]:
+        pass
+
+    @abstractmethod
+    def weekly_totals(self) -> Dict[str, int]:
+        pass
+
+    @abstractmethod
+    def tier_daily(self) -> list:
+        """[(tier, day, count)]"""
+
+    @abstractmethod
+    def user_page(self, search: str = "", offset: int = 0, limit: int = 20) -> list:
+        """One page of per-user totals matching search, biggest first"""
+
+    @abstractmethod
+    def count_users(self, search: str = "") -> int:
+        """How many users match search, without reading their rows"""
+
+    @abstractmethod
+    def user_daily(self, user: str) -> Dict[str, int]:
+        pass
+
+    def increment(self, user: str, day: str, amount: int, tier: str = "default") -> None:
+        if amount <= 0:
+            return
+        with self._lock:
+            self._pending[(user, day)] += amount
+            self._tiers[user] = tier
+            self._start_flusher()
+
+    def get(self, user: str, day: str) -> int:
+        key = (user, day)
+        with self._lock:
+            self._accessed[key] = time.monotonic()
+            known = key in self._base
+        if not known:
+            try:
+                count = self._fetch_many([key]).get(key, 0)
+            except Exception as e:
+                print(f"Usage read error: {str(e)}")
+                count = 0
+            with self._lock:
+                self._base.setdefault(key, count)
+                self._fetched.setdefault(key, time.monotonic())
+                self._start_flusher()
+        with self._lock:
+            return self._base[key] + self._inflight.get(key, 0) + self._pending.get(key, 0)
+
+    def data_version(self) -> int:
+        """Changes whenever any replica flushes; use it as the cache key for dashboard data"""
+        self.flush()
+        return self._read_version()
+
+    def flush(self) -> None:
+        """Write the buffered increments to the backend in one batch"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                self._inflight, self._pending = dict(self._pending), defaultdict(int)
+                tiers = dict(self._tiers)
+            try:
+                self._increment_many(self._inflight, rollup_deltas(self._inflight, tiers))
+            except Exception as e:
+                print(f"Usage write error: {str(e)}")
+                with self._lock:
+                    # Giữ lại để lần flush sau ghi tiếp, không mất lượt dùng
+                    for key, amount in self._inflight.items():
+                        self._pending[key] += amount
+                    self._inflight = {}
+                return
+            with self._lock:
+                for key, amount in self._inflight.items():
+                    if key in self._base:
+                        self._base[key] += amount
+                self._inflight = {}
+
+    def refresh(self) -> None:
+        """Reload stale keys from the backend and forget keys nobody reads any more"""
+        now = time.monotonic()
+        with self._lock:
+            for key in [key for key, seen in self._accessed.items() if now - seen > self.IDLE_SECONDS]:
+                del self._accessed[key]
+                self._base.pop(key, None)
+                self._fetched.pop(key, None)
+            stale = [key for key, fetched in self._fetched.items() if now - fetched >= self.ttl]
+        if not stale:
+            return
+        try:
+            counts = self._fetch_many(stale)
+        except Exception as e:
+            print(f"Usage read error: {str(e)}")
+            return
+        with self._lock:
+            for key in stale:
+                if key in self._base:
+                    self._base[key] = counts.get(key, 0)
+                    self._fetched[key] = now
+
+    def _start_flusher(self):
+        """Start the flush/refresh thread on first use; caller holds self._lock"""
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._run_flusher, name="usage-flusher", daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            # refresh sau flush để giá trị đọc về đã gồm phần vừa ghi
+            self.flush()
+            self.refresh()
+
+
+class MemoryUsageStore(UsageStore):
+    """Process-local backend, used when no persistent backend is configured or reachable"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._data: Dict[Key, int] = defaultdict(int)
+        self._days: Dict[str, int] = defaultdict(int)
+        self._weeks: Dict[str, int] = defaultdict(int)
+        self._tier_days: Dict[Key, int] = defaultdict(int)
+        self._users: Dict[str, tuple] = {}
+        self._version = 0
+        self._data_lock = threading.Lock()
+
+    def _increment_many(self, amounts, rollups):
+        with self._data_lock:
+            for key, amount in amounts.items():
+                self._data[key] += amount
+            for day, amount in rollups['days'].items():
+                self._days[day] += amount
+            for week, amount in rollups['weeks'].items():
+                self._weeks[week] += amount
+            for key, amount in rollups['tier_days'].items():
+                self._tier_days[key] += amount
+            for user, (tier, amount, last_day) in rollups['users'].items():
+                _, total, previous_day = self._users.get(user, (tier, 0, ""))
+                self._users[user] = (tier, total + amount, max(previous_day, last_day))
+            self._version += 1
+
+    def _fetch_many(self, keys):
+        with self._data_lock:
+            return {key: self._data[key] for key in keys if key in self._data}
+
+    def _read_version(self):
+        return self._version
+
+    def summary(self):
+        with self._data_lock:
+            return {'users': len(self._users), 'chars': sum(self._days.values())}
+
+    def daily_totals(self):
+        with self._data_lock:
+            return dict(sorted(self._days.items()))
+
+    def weekly_totals(self):
+        with self._data_lock:
+            return dict(sorted(self._weeks.items()))
+
+    def tier_daily(self):
+        with self._data_lock:
+            return [(tier, day, count) for (tier, day), count in sorted(self._tier_days.items())]
+
+    def user_page(self, search="", offset=0, limit=20):
+        with self._data_lock:
+            rows = [
+                {'user': user, 'tier': tier, 'total': total, 'last_day': last_day}
+                for user, (tier, total, last_day) in self._users.items()
+                if search.lower() in user.lower()
+            ]
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows[offset:offset + limit]
+
+    def count_users(self, search=""):
+        search = search.lower()
+        with self._data_lock:
+            return sum(1 for user in self._users if search in user.lower())
+
+    def user_daily(self, user):
+        with self._data_lock:
+            return {day: count for (name, day), count in sorted(self._data.items()) if name == user}
+
+
+class SQLiteUsageStore(UsageStore):
+    """Usage counters in a local SQLite file, shared by every process on the host"""
+
+    def __init__(self, path: str = ".cache/usage.db", **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage ("
+            " user TEXT NOT NULL,"
+            " day TEXT NOT NULL,"
+            " count INTEGER NOT NULL,"
+            " PRIMARY KEY (user, day)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS usage_days (day TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS usage_weeks (week TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage_tiers ("
+            " tier TEXT NOT NULL,"
+            " day TEXT NOT NULL,"
+            " count INTEGER NOT NULL,"
+            " PRIMARY KEY (tier, day)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage_users ("
+            " user TEXT PRIMARY KEY,"
+            " tier TEXT NOT NULL,"
+            " total INTEGER NOT NULL,"
+            " last_day TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_users_total ON usage_users(total)")
+        conn.execute("CREATE TABLE IF NOT EXISTS usage_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO usage_meta (key, value) VALUES ('version', 0)")
+
+        # File tạo từ phiên bản chưa có rollup: dựng lại một lần từ bảng usage
+        has_usage = conn.execute("SELECT 1 FROM usage LIMIT 1").fetchone()
+        has_rollups = conn.execute("SELECT 1 FROM usage_users LIMIT 1").fetchone()
+        if has_usage and not has_rollups:
+            amounts = self._fetch_all()
+            self._write(conn, {}, rollup_deltas(amounts, {}))
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, amounts: Dict[Key, int], rollups: dict) -> None:
+        conn.executemany(
+            "INSERT INTO usage (user, day, count) VALUES (?, ?, ?)"
+            " ON CONFLICT (user, day) DO UPDATE SET count = count + excluded.count",
+            [(user, day, amount) for (user, day), amount in amounts.items()]
+        )
+        conn.executemany(
+            "INSERT INTO usage_days (day, count) VALUES (?, ?)"
+            " ON CONFLICT (day) DO UPDATE SET count = count + excluded.count",
+            rollups['days'].items()
+        )
+        conn.executemany(
+            "INSERT INTO usage_weeks (week, count) VALUES (?, ?)"
+            " ON CONFLICT (week) DO UPDATE SET count = count + excluded.count",
+            rollups['weeks'].items()
+        )
+        conn.executemany(
+            "INSERT INTO usage_tiers (tier, day, count) VALUES (?, ?, ?)"
+            " ON CONFLICT (tier, day) DO UPDATE SET count = count + excluded.count",
+            [(tier, day, amount) for (tier, day), amount in rollups['tier_days'].items()]
+        )
+        conn.executemany(
+            "INSERT INTO usage_users (user, tier, total, last_day) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (user) DO UPDATE SET tier = excluded.tier, total = total + excluded.total,"
+            " last_day = MAX(last_day, excluded.last_day)",
+            [(user, tier, total, last_day) for user, (tier, total, last_day) in rollups['users'].items()]
+        )
+        conn.execute("UPDATE usage_meta SET value = value + 1 WHERE key = 'version'")
+
+    def _increment_many(self, amounts, rollups):
+        conn = self._connect()
+        # Một transaction: counter và rollup luôn khớp nhau; lỗi giữa chừng thì rollback toàn bộ
+        # để flush() ghi lại không bị cộng hai lần
+        with conn:
+            self._write(conn, amounts, rollups)
+
+    def _fetch_many(self, keys):
+        conn = self._connect()
+        counts = {}
+        for user, day in keys:
+            row = conn.execute("SELECT count FROM usage WHERE user = ? AND day = ?", (user, day)).fetchone()
+            if row is not None:
+                counts[(user, day)] = row[0]
+        return counts
+
+    def _fetch_all(self):
+        rows = self._connect().execute("SELECT user, day, count FROM usage").fetchall()
+        return {(user, day): count for user, day, count in rows}
+
+    def _read_version(self):
+        return self._connect().execute("SELECT value FROM usage_meta WHERE key = 'version'").fetchone()[0]
+
+    def summary(self):
+        conn = self._connect()
+        users = conn.execute("SELECT COUNT(*) FROM usage_users").fetchone()[0]
+        chars = conn.execute("SELECT COALESCE(SUM(count), 0) FROM usage_days").fetchone()[0]
+        return {'users': users, 'chars': chars}
+
+    def daily_totals(self):
+        return dict(self._connect().execute("SELECT day, count FROM usage_days ORDER BY day").fetchall())
+
+    def weekly_totals(self):
+        return dict(self._connect().execute("SELECT week, count FROM usage_weeks ORDER BY week").fetchall())
+
+    def tier_daily(self):
+        return self._connect().execute("SELECT tier, day, count FROM usage_tiers ORDER BY day, tier").fetchall()
+
+    USER_SEARCH = " WHERE user LIKE ? ESCAPE '\\'"
+
+    @staticmethod
+    def _like_pattern(search: str) -> str:
+        return "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+    def user_page(self, search="", offset=0, limit=20):
+        rows = self._connect().execute(
+            "SELECT user, tier, total, last_day FROM usage_users" + self.USER_SEARCH +
+            " ORDER BY total DESC LIMIT ? OFFSET ?",
+            (self._like_pattern(search), limit, offset)
+        ).fetchall()
+        return [
+            {'user': user, 'tier': tier, 'total': count, 'last_day': last_day}
+            for user, tier, count, last_day in rows
+        ]
+
+    def count_users(self, search=""):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM usage_users" + self.USER_SEARCH, (self._like_pattern(search),)
+        ).fetchone()[0]
+
+    def user_daily(self, user):
+        rows = self._connect().execute("SELECT day, count FROM usage WHERE user = ? ORDER BY day", (user,))
+        return dict(rows.fetchall())
+
+
+class MongoUsageStore(UsageStore):
+    """Usage counters in MongoDB, shared by every replica.
+
+    Rollups live next to the counters: <collection>_rollups holds one document per day, week and
+    (tier, day) plus the data version, <collection>_users one document per user.
+    """
+
+    def __init__(self, uri: str, database: str = "translator", collection: str = "usage", **kwargs):
+        super().__init__(**kwargs)
+        from pymongo import ASCENDING, DESCENDING, MongoClient
+
+        self._client = MongoClient(uri, serverSelectionTimeoutMS=5000)
+        db = self._client[database]
+        self._collection = db[collection]
+        self._rollups = db[collection + "_rollups"]
+        self._users = db[collection + "_users"]
+        self._collection.create_index([("user", ASCENDING), ("day", ASCENDING)])
+        self._rollups.create_index([("kind", ASCENDING), ("day", ASCENDING)])
+        self._users.create_index([("total", DESCENDING)])
+
+        # Transaction cần replica set hoặc mongos (Atlas luôn có)
+        hello = self._client.admin.command("hello")
+        self._transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+        if not self._transactions:
+            print("Usage store: MongoDB is standalone, a failed flush may be counted twice on retry")
+
+    @staticmethod
+    def _doc_id(key: Key) -> str:
+        return "\x1f".join(key)
+
+    def _increment_many(self, amounts, rollups):
+        if not self._transactions:
+            self._write(amounts, rollups)
+            return
+        # Ba bulk_write trong một transaction: flush() thử lại không cộng hai lần phần đã ghi
+        with self._client.start_session() as session:
+            session.with_transaction(lambda s: self._write(amounts, rollups, s))
+
+    def _write(self, amounts, rollups, session=None):
+        from pymongo import UpdateOne
+
+        self._collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": self._doc_id(key)},
+                    {"$inc": {"count": amount}, "$setOnInsert": {"user": key[0], "day": key[1]}},
+                    upsert=True
+                )
+                for key, amount in amounts.items()
+            ],
+            ordered=False,
+            session=session
+        )
+
+        updates = [
+            UpdateOne(
+                {"_id": "day\x1f" + day},
+                {"$inc": {"count": amount}, "$setOnInsert": {"kind": "day", "day": day}},
+                upsert=True
+            )
+            for day, amount in rollups['days'].items()
+        ]
+        updates += [
+            UpdateOne(
+                {"_id": "week\x1f" + week},
+                {"$inc": {"count": amount}, "$setOnInsert": {"kind": "week", "day": week}},
+                upsert=True
+            )
+            for week, amount in rollups['weeks'].items()
+        ]
+        updates += [
+            UpdateOne(
+                {"_id": "tier\x1f" + tier + "\x1f" + day},
+                {"$inc": {"count": amount}, "$setOnInsert": {"kind": "tier", "tier": tier, "day": day}},
+                upsert=True
+            )
+            for (tier, day), amount in rollups['tier_days'].items()
+        ]
+        updates.append(
+            UpdateOne({"_id": "version"}, {"$inc": {"count": 1}, "$setOnInsert": {"kind": "version"}}, upsert=True)
+        )
+        self._rollups.bulk_write(updates, ordered=False, session=session)
+
+        if rollups['users']:
+            self._users.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": user},
+                        {"$inc": {"total": total}, "$set": {"tier": tier}, "$max": {"last_day": last_day}},
+                        upsert=True
+                    )
+                    for user, (tier, total, last_day) in rollups['users'].items()
+                ],
+                ordered=False,
+                session=session
+            )
+
+    def _fetch_many(self, keys):
+        ids = [self._doc_id(key) for key in keys]
+        docs = self._collection.find({"_id": {"$in": ids}}, {"user": 1, "day": 1, "count": 1})
+        return {(doc["user"], doc["day"]): doc["count"] for doc in docs}
+
+    def _read_version(self):
+        doc = self._rollups.find_one({"_id": "version"})
+        return doc["count"] if doc else 0
+
+    def summary(self):
+        chars = sum(doc["count"] for doc in self._rollups.find({"kind": "day"}, {"count": 1}))
+        return {'users': self._users.estimated_document_count(), 'chars': chars}
+
+    def _rollup(self, kind: str) -> Dict[str, int]:
+        docs = self._rollups.find({"kind": kind}, {"day": 1, "count": 1}).sort("day", 1)
+        return {doc["day"]: doc["count"] for doc in docs}
+
+    def daily_totals(self):
+        return self._rollup("day")
+
+    def weekly_totals(self):
+        return self._rollup("week")
+
+    def tier_daily(self):
+        docs = self._rollups.find({"kind": "tier"}, {"tier": 1, "day": 1, "count": 1}).sort("day", 1)
+        return [(doc["tier"], doc["day"], doc["count"]) for doc in docs]
+
+    @staticmethod
+    def _user_query(search: str) -> dict:
+        import re
+
+        return {"_id": {"$regex": re.escape(search), "$options": "i"}} if search else {}
+
+    def user_page(self, search="", offset=0, limit=20):
+        # limit(0) của pymongo nghĩa là không giới hạn
+        if limit <= 0:
+            return []
+        docs = self._users.find(self._user_query(search)).sort("total", -1).skip(offset).limit(limit)
+        return [
+            {
+                'user': doc["_id"],
+                'tier': doc.get("tier", "default"),
+                'total': doc["total"],
+                'last_day': doc["last_day"],
+            }
+            for doc in docs
+        ]
+
+    def count_users(self, search=""):
+        return self._users.count_documents(self._user_query(search))
+
+    def user_daily(self, user):
+        docs = self._collection.find({"user": user}, {"day": 1, "count": 1}).sort("day", 1)
+        return {doc["day"]: doc["count"] for doc in docs}
+
+
+def get_usage_store() -> UsageStore:
+    """Process-wide usage store from the [usage] secrets, in memory if the backend is unavailable"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            config = config_section("usage")
+            timing = {
+                'flush_interval': config.get("flush_interval", 2.0),
+                'ttl': config.get("ttl", 5.0),
+            }
+            backend = config.get("backend", "sqlite")
+            try:
+                if backend == "mongodb":
+                    _store = MongoUsageStore(
+                        config["uri"],
+                        database=config.get("database", "translator"),
+                        collection=config.get("collection", "usage"),
+                        **timing
+                    )
+                elif backend == "sqlite":
+                    _store = SQLiteUsageStore(path=config.get("path", ".cache/usage.db"), **timing)
+                else:
+                    _store = MemoryUsageStore(**timing)
+            except Exception as e:
+                print(f"Usage Store Error: {str(e)}")
+                _store = MemoryUsageStore(**timing)
+        return _store